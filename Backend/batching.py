@@ -0,0 +1,117 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import pandas as pd
+
+from config import BATCH_MAX_ROWS, BATCH_MAX_WAIT_MS
+from metrics import Histogram, LATENCY_BUCKETS, ROW_BUCKETS, add_request_timings
+from workers import ScoreResult, WorkerPool
+
+@dataclass
+class _Request:
+    df: pd.DataFrame
+    explain: bool
+    version: Optional[str]
+    method: str
+    future: asyncio.Future
+    enqueued: float
+    dispatched: Optional[float] = None
+
+class MicroBatcher:
+    # coalesces concurrent requests into one model call, up to max_batch_rows
+    # rows or max_wait_ms after the first request of a batch arrived; up to one
+    # batch per pool worker is in flight at a time
+    def __init__(self, pool: WorkerPool, max_batch_rows: int = BATCH_MAX_ROWS,
+                 max_wait_ms: float = BATCH_MAX_WAIT_MS):
+        self.pool = pool
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self._loop = None
+        self._queue = None
+        self._slots = None
+        self._task = None
+
+        self.batch_rows = Histogram(ROW_BUCKETS)
+        self.batch_requests = Histogram(ROW_BUCKETS)
+        self.queue_wait = Histogram(LATENCY_BUCKETS)
+        self.batch_latency = Histogram(LATENCY_BUCKETS)
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.pool.workers)
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, df: pd.DataFrame, explain: bool = True, version: Optional[str] = None,
+                     method: str = "exact") -> ScoreResult:
+        self._ensure_started()
+        future = self._loop.create_future()
+        item = _Request(df, explain, version, method, future, time.perf_counter())
+        await self._queue.put(item)
+        result = await future
+        add_request_timings({"queue": item.dispatched - item.enqueued})
+        return result
+
+    async def _run(self):
+        carry: Optional[_Request] = None
+        while True:
+            first = carry if carry is not None else await self._queue.get()
+            carry = None
+            batch, rows = [first], len(first.df)
+            deadline = self._loop.time() + self.max_wait
+            while rows < self.max_batch_rows:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if (rows + len(item.df) > self.max_batch_rows or item.version != first.version
+                        or item.method != first.method):
+                    # starts the next batch instead of overflowing this one;
+                    # a batch is scored by a single model version and
+                    # explanation algorithm
+                    carry = item
+                    break
+                batch.append(item)
+                rows += len(item.df)
+            await self._slots.acquire()
+            self._loop.create_task(self._dispatch(batch, rows))
+
+    async def _dispatch(self, batch: List[_Request], rows: int):
+        start = time.perf_counter()
+        for item in batch:
+            item.dispatched = start
+            self.queue_wait.observe(start - item.enqueued)
+        try:
+            results = await self.pool.score([item.df for item in batch], [item.explain for item in batch],
+                                            batch[0].version, batch[0].method)
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        for item, result in zip(batch, results):
+            # callers that disconnected have cancelled their futures
+            if not item.future.done():
+                item.future.set_result(result)
+        self.batch_latency.observe(time.perf_counter() - start)
+        self.batch_rows.observe(rows)
+        self.batch_requests.observe(len(batch))
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_rows": self.max_batch_rows,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_rows": self.batch_rows.snapshot(),
+            "batch_requests": self.batch_requests.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "batch_latency_seconds": self.batch_latency.snapshot(),
+        }
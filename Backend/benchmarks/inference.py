@@ -0,0 +1,62 @@
+# per-row inference cost: legacy predict + predict_proba + explainer(df)
+# versus the single-pass InferenceEngine
+#
+# usage (from Backend/): python -m benchmarks.inference [--repeat N]
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import shap
+from xgboost import XGBClassifier
+
+from features import final_features
+from inference import InferenceEngine
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+def legacy(model, explainer, df, explain):
+    predictions = model.predict(df)
+    probabilities = model.predict_proba(df)[:, 1]
+    shap_values = explainer(df).values if explain else None
+    return predictions, probabilities, shap_values
+
+def timeit(fn, repeat):
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="../Training/inference_test.csv")
+    parser.add_argument("--model", default="model.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    model = XGBClassifier()
+    model.load_model(args.model)
+    explainer = shap.TreeExplainer(model)
+    engine = InferenceEngine(model.get_booster())
+
+    source = pd.read_csv(args.data)[final_features].astype(float)
+
+    # both paths must agree before timing them
+    _, legacy_prob, legacy_shap = legacy(model, explainer, source, True)
+    _, engine_prob, engine_shap = engine.predict(source)
+    assert np.allclose(legacy_prob, engine_prob, atol=1e-6)
+    assert np.allclose(legacy_shap, engine_shap, atol=1e-5)
+
+    print(f"{'rows':>7} {'shap':>5} {'legacy us/row':>14} {'engine us/row':>14} {'speedup':>8}")
+    for n in BATCH_SIZES:
+        df = source.sample(n, replace=True, random_state=0).reset_index(drop=True)
+        for explain in (False, True):
+            before = timeit(lambda: legacy(model, explainer, df, explain), args.repeat)
+            after = timeit(lambda: engine.predict(df, explain=explain), args.repeat)
+            print(f"{n:>7} {str(explain):>5} {before / n * 1e6:>14.1f} {after / n * 1e6:>14.1f} {before / after:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# cold-start timing: each phase is measured in a fresh interpreter so imports
+# and model loading are not served from a warm process
+#   import  - `import main` (all serving modules and their dependencies)
+#   legacy  - XGBClassifier from JSON + shap.TreeExplainer + flat engine from JSON
+#   json    - Booster + flat engine from JSON (no artifact)
+#   artifact- Booster from UBJSON + flat engine from npz
+# plus time to the first scored row (with SHAP) after loading
+#
+# usage (from Backend/): python -m benchmarks.startup [--runs N]
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+PHASES = {
+    "import": """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start, 0.0)
+""",
+    "legacy": """
+import time
+import numpy as np, pandas as pd, shap
+from xgboost import XGBClassifier
+from features import final_features
+from tree_engine import FlatTreeEnsemble
+start = time.perf_counter()
+model = XGBClassifier()
+model.load_model("model.json")
+explainer = shap.TreeExplainer(model)
+flat = FlatTreeEnsemble.from_json("model.json")
+loaded = time.perf_counter()
+df = pd.DataFrame(np.full((1, len(final_features)), 0.5), columns=final_features)
+model.predict_proba(df)
+explainer.shap_values(df)
+print(loaded - start, time.perf_counter() - loaded)
+""",
+    "json": """
+import time
+import numpy as np, pandas as pd
+import xgboost as xgb
+from features import final_features
+from inference import InferenceEngine
+from tree_engine import FlatTreeEnsemble
+start = time.perf_counter()
+booster = xgb.Booster()
+booster.load_model("model.json")
+engine = InferenceEngine(booster, flat=FlatTreeEnsemble.from_json("model.json"))
+loaded = time.perf_counter()
+engine.predict(pd.DataFrame(np.full((1, len(final_features)), 0.5), columns=final_features))
+print(loaded - start, time.perf_counter() - loaded)
+""",
+    "artifact": """
+import time
+import numpy as np, pandas as pd
+import artifact
+from features import final_features
+from inference import InferenceEngine
+start = time.perf_counter()
+booster, flat = artifact.load()
+engine = InferenceEngine(booster, flat=flat)
+loaded = time.perf_counter()
+engine.predict(pd.DataFrame(np.full((1, len(final_features)), 0.5), columns=final_features))
+print(loaded - start, time.perf_counter() - loaded)
+""",
+}
+
+def run(code: str):
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    load, first = out.stdout.split()[-2:]
+    return float(load), float(first)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    import artifact
+    if artifact.load() is None:
+        artifact.build()
+
+    results = {}
+    print(f"{'phase':>9} {'load ms':>9} {'first row ms':>13}")
+    for phase, code in PHASES.items():
+        timings = np.array([run(code) for _ in range(args.runs)])
+        load, first = np.median(timings, axis=0) * 1e3
+        results[phase] = {"load_ms": load, "first_row_ms": first}
+        print(f"{phase:>9} {load:9.1f} {first:13.1f}")
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
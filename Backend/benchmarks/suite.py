@@ -0,0 +1,260 @@
+# reproducible benchmark and load-test suite on synthetic batches resampled
+# from Training/inference_test.csv (values jittered so rows are unique):
+#   stages - parse, validate_input, predict, explain, serialize, compress (zstd)
+#            and the whole scoring job, in-process, per batch size
+#   load   - concurrent clients posting to /predict on a local uvicorn (started
+#            here unless --url is given)
+# each result has p50/p95/p99 latency, rows per second and peak RSS; --save
+# writes them as JSON and --compare flags regressions against such a file.
+# The prediction cache is off unless --cache, so repeats measure the model.
+# Linux only: peak RSS is the VmHWM high-water mark read from /proc.
+#
+# usage (from Backend/):
+#   python -m benchmarks.suite [--sizes 1 10 1000] [--skip-load]
+#   python -m benchmarks.suite --save baseline.json
+#   python -m benchmarks.suite --compare baseline.json [--tolerance 0.2]
+import argparse
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+STAGE_SIZES = [1, 10, 1000, 100000, 1000000]
+LOAD_SIZES = [1, 10, 1000]
+
+def reset_peak_rss(pid="self"):
+    # linux resets the VmHWM high-water mark when "5" is written to clear_refs
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mb(pid="self") -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+def summarize(timings, rows: int, peak: float) -> dict:
+    timings = np.asarray(timings)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1e3
+    return {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "rows_per_s": rows * len(timings) / timings.sum(),
+            "peak_rss_mb": peak, "runs": len(timings)}
+
+def synthetic(source: pd.DataFrame, n: int, seed: int = 0) -> pd.DataFrame:
+    from validation import input_validator
+
+    rng = np.random.default_rng(seed)
+    X = source.to_numpy()[rng.integers(0, len(source), n)]
+    X = X * (1 + rng.normal(0, 1e-3, X.shape))
+    X = np.clip(X, input_validator.lower, input_validator.upper)
+    return pd.DataFrame(X, columns=source.columns)
+
+def repeats_for(n: int) -> int:
+    # enough runs for stable percentiles on small batches, a few on large ones
+    return int(np.clip(200_000 // max(n, 1), 3, 200))
+
+def run_stage(fn, rows: int, repeats: int) -> dict:
+    if rows <= 10000:
+        fn()  # warm-up
+    reset_peak_rss()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings, rows, peak_rss_mb())
+
+def bench_stages(source: pd.DataFrame, sizes, explain_max_rows: int) -> dict:
+    import workers
+    from explanations import serialize_shap
+    from formats import JSON, compress, dumps
+    from ingest import read_upload
+    from validation import validate_input
+
+    engine = workers.load_engine()
+    workers.set_engine(engine)
+
+    results = {}
+    for n in sizes:
+        df = synthetic(source, n)
+        body = df.to_csv(index=False).encode()
+        X = engine.as_matrix(df)
+        explain = n <= explain_max_rows
+        predictions, probabilities, _ = engine.predict(X, explain=False)
+        shap_values = engine.explain(X) if explain else None
+        response = dumps({"predictions": predictions, "probabilities": probabilities,
+                          **serialize_shap(shap_values, "full")})
+        repeats = repeats_for(n)
+
+        stages = {
+            "parse": lambda: read_upload(io.BytesIO(body), "text/csv", "data.csv"),
+            "validate_input": lambda: validate_input(df),
+            "predict": lambda: engine.predict(X, explain=False),
+            "serialize": lambda: dumps({"predictions": predictions, "probabilities": probabilities,
+                                        **serialize_shap(shap_values, "full")}),
+            "compress": lambda: compress(response, JSON, "zstd"),
+            "score": lambda: workers.score_frames([df], [explain]),
+        }
+        if explain:
+            stages["explain"] = lambda: engine.explain(X)
+        for stage, fn in stages.items():
+            key = f"{stage}/{n}"
+            results[key] = run_stage(fn, n, repeats if stage != "explain" else min(repeats, 5))
+            print(f"{key:>24} " + format_result(results[key]), flush=True)
+    return results
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(cache: bool):
+    import httpx
+
+    port = free_port()
+    env = {**os.environ, "MAX_PENDING_REQUESTS": "10000"}
+    if not cache:
+        env["PREDICTION_CACHE_ENABLED"] = "0"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            httpx.get(f"{url}/health").raise_for_status()
+            return process, url
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                raise RuntimeError("uvicorn exited during start-up")
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("uvicorn did not start")
+
+def bench_load(source: pd.DataFrame, url: str, pid, sizes, clients: int, requests: int, explain: str) -> dict:
+    import httpx
+
+    results = {}
+    for n in sizes:
+        # distinct bodies, so repeated requests are not served from a cache
+        bodies = [synthetic(source, n, seed).to_csv(index=False).encode() for seed in range(min(requests, 32))]
+        local = threading.local()
+
+        def post(i):
+            if not hasattr(local, "client"):
+                local.client = httpx.Client(base_url=url, timeout=600)
+            start = time.perf_counter()
+            response = local.client.post(f"/predict?explain={explain}",
+                                         files={"file": ("data.csv", bodies[i % len(bodies)], "text/csv")})
+            return time.perf_counter() - start, response.status_code
+
+        post(0)  # warm-up
+        if pid is not None:
+            reset_peak_rss(pid)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(clients) as executor:
+            outcomes = list(executor.map(post, range(requests)))
+        elapsed = time.perf_counter() - start
+
+        timings = [t for t, status in outcomes if status == 200]
+        key = f"load/{n}x{clients}/{explain}"
+        results[key] = {
+            **summarize(timings or [float("nan")], n, peak_rss_mb(pid) if pid is not None else float("nan")),
+            "rows_per_s": n * len(timings) / elapsed,
+            "requests_per_s": len(timings) / elapsed,
+            "errors": len(outcomes) - len(timings),
+        }
+        print(f"{key:>24} " + format_result(results[key]), flush=True)
+    return results
+
+def format_result(result: dict) -> str:
+    return (f"p50 {result['p50_ms']:10.2f} ms  p95 {result['p95_ms']:10.2f} ms  p99 {result['p99_ms']:10.2f} ms  "
+            f"{result['rows_per_s']:12.0f} rows/s  peak {result['peak_rss_mb']:8.1f} MB")
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    # a regression is a slower p50 or lower throughput beyond the tolerance
+    regressions = False
+    print(f"\n{'benchmark':>24} {'p50 base':>10} {'p50 now':>10} {'change':>8}  {'rows/s change':>13}")
+    for key, now in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        p50_change = now["p50_ms"] / base["p50_ms"] - 1
+        throughput_change = now["rows_per_s"] / base["rows_per_s"] - 1
+        flag = p50_change > tolerance or throughput_change < -tolerance
+        regressions |= flag
+        print(f"{key:>24} {base['p50_ms']:10.2f} {now['p50_ms']:10.2f} {p50_change:+8.1%}  {throughput_change:+13.1%}"
+              + ("  REGRESSION" if flag else ""))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="../Training/inference_test.csv")
+    parser.add_argument("--sizes", type=int, nargs="+", default=STAGE_SIZES)
+    parser.add_argument("--explain-max-rows", type=int, default=10000,
+                        help="largest batch SHAP is benchmarked on; SHAP costs about 1 ms per row")
+    parser.add_argument("--load-sizes", type=int, nargs="+", default=LOAD_SIZES)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--explain", default="none", help="explain mode of the load-test requests")
+    parser.add_argument("--url", help="load test this server instead of starting uvicorn")
+    parser.add_argument("--skip-stages", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--cache", action="store_true", help="keep the prediction cache enabled")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if not args.cache:
+        os.environ["PREDICTION_CACHE_ENABLED"] = "0"
+    from features import final_features
+    source = pd.read_csv(args.data)[final_features].astype(float)
+
+    results = {}
+    if not args.skip_stages:
+        results.update(bench_stages(source, args.sizes, args.explain_max_rows))
+    if not args.skip_load:
+        process, url, pid = None, args.url, None
+        if url is None:
+            process, url = start_server(args.cache)
+            pid = process.pid
+        try:
+            results.update(bench_load(source, url, pid, args.load_sizes, args.clients, args.requests, args.explain))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    if args.save:
+        import xgboost
+
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                         "xgboost": xgboost.__version__, "cpus": os.cpu_count(), "machine": platform.machine()},
+                "results": results,
+            }, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
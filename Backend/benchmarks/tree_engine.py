@@ -0,0 +1,65 @@
+# parity check of the flattened tree engine against XGBClassifier.predict_proba
+# on Training/inference_test.csv, followed by small-batch latency
+#
+# usage (from Backend/): python -m benchmarks.tree_engine [--repeat N]
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from xgboost import XGBClassifier
+
+from features import final_features
+from tree_engine import FlatTreeEnsemble
+
+BATCH_SIZES = [1, 2, 5, 10, 20, 50, 100]
+TOLERANCE = 1e-5
+
+def percentiles(fn, repeat):
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return np.percentile(timings, [50, 99]) * 1e3
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="../Training/inference_test.csv")
+    parser.add_argument("--model", default="model.json")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    model = XGBClassifier()
+    model.load_model(args.model)
+    flat = FlatTreeEnsemble.from_json(args.model)
+
+    df = pd.read_csv(args.data)[final_features].astype(float)
+    X = df.to_numpy(dtype=np.float32)
+
+    # parity, including rows with missing values
+    expected = model.predict_proba(df)[:, 1]
+    actual = 1.0 / (1.0 + np.exp(-flat.margins(X)))
+    X_missing = X.copy()
+    X_missing[::3, ::4] = np.nan
+    expected_missing = model.predict_proba(pd.DataFrame(X_missing, columns=final_features))[:, 1]
+    actual_missing = 1.0 / (1.0 + np.exp(-flat.margins(X_missing)))
+
+    error = max(np.abs(expected - actual).max(), np.abs(expected_missing - actual_missing).max())
+    labels_match = np.array_equal(model.predict(df), (actual > 0.5).astype(int))
+    print(f"parity: max |probability difference| = {error:.2e}, labels match: {labels_match}")
+    if error > TOLERANCE or not labels_match:
+        print("FAILED")
+        sys.exit(1)
+
+    print(f"{'rows':>5} {'xgboost p50/p99 ms':>20} {'flat p50/p99 ms':>18}")
+    for n in BATCH_SIZES:
+        batch_df, batch_X = df.iloc[:n], X[:n]
+        xgb_p50, xgb_p99 = percentiles(lambda: model.predict_proba(batch_df), args.repeat)
+        flat_p50, flat_p99 = percentiles(lambda: flat.margins(batch_X), args.repeat)
+        print(f"{n:>5} {xgb_p50:>10.3f}/{xgb_p99:<9.3f} {flat_p50:>8.3f}/{flat_p99:<9.3f}")
+
+if __name__ == "__main__":
+    main()
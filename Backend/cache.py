@@ -0,0 +1,132 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import (PREDICTION_CACHE_ENABLED, PREDICTION_CACHE_MAX_ENTRIES, PREDICTION_CACHE_MAX_MB,
+                    PREDICTION_CACHE_TTL_S, PREDICTION_CACHE_POLICY)
+
+# approximate per-entry cost on top of the key and SHAP bytes: the entry tuple,
+# the probability and expiry floats and the OrderedDict link
+_ENTRY_OVERHEAD = 200
+
+class PredictionCache:
+    # content-addressed results per feature row: the key is a hash of the row's
+    # float32 values keyed with the model hash, the value is the probability
+    # and, once a request asked for it, the row's SHAP values.
+    # policy "lru" refreshes entries on hit, "fifo" evicts in insertion order
+    def __init__(self, max_entries: int = PREDICTION_CACHE_MAX_ENTRIES,
+                 max_bytes: int = int(PREDICTION_CACHE_MAX_MB * 2 ** 20),
+                 ttl: float = PREDICTION_CACHE_TTL_S, policy: str = PREDICTION_CACHE_POLICY):
+        if policy not in ("lru", "fifo"):
+            raise ValueError(f"Unknown cache policy {policy}.")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.policy = policy
+        self._entries: "OrderedDict[bytes, Tuple[float, Optional[bytes], float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def keys(X: np.ndarray, model_hash: str) -> List[bytes]:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        data, width = X.tobytes(), X.shape[1] * X.itemsize
+        key = hashlib.sha256(model_hash.encode()).digest()
+        return [hashlib.blake2b(data[i:i + width], digest_size=16, key=key).digest()
+                for i in range(0, len(data), width)]
+
+    def get(self, keys: List[bytes], explain: np.ndarray,
+            n_features: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # found mask, probabilities and SHAP (n_rows, n_features) for the rows
+        # served from the cache; rows that need SHAP only hit entries that have it
+        found = np.zeros(len(keys), dtype=bool)
+        probabilities = np.zeros(len(keys))
+        shap_values = np.zeros((len(keys), n_features), dtype=np.float32)
+        shap_rows, shap_at = [], []
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[2] < now:
+                    self._remove(key)
+                    self.expirations += 1
+                    continue
+                if explain[i] and entry[1] is None:
+                    continue
+                found[i] = True
+                probabilities[i] = entry[0]
+                if explain[i]:
+                    shap_rows.append(entry[1])
+                    shap_at.append(i)
+                if self.policy == "lru":
+                    self._entries.move_to_end(key)
+            n_found = int(found.sum())
+            self.hits += n_found
+            self.misses += len(keys) - n_found
+
+        if shap_rows:
+            shap_values[shap_at] = np.frombuffer(b"".join(shap_rows), dtype=np.float32).reshape(len(shap_at), n_features)
+        return found, probabilities, shap_values
+
+    def put(self, keys: List[bytes], probabilities: np.ndarray, shap_values: np.ndarray, explained: np.ndarray):
+        # shap_values has one row per key, only the explained rows are stored
+        shap_values = np.ascontiguousarray(shap_values, dtype=np.float32)
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for i, key in enumerate(keys):
+                shap_row = shap_values[i].tobytes() if explained[i] else None
+                if key in self._entries:
+                    if shap_row is None:
+                        # keep SHAP computed by an earlier request
+                        shap_row = self._entries[key][1]
+                    self._remove(key)
+                self._entries[key] = (float(probabilities[i]), shap_row, expires)
+                self._bytes += self._size(key, shap_row)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: bytes):
+        _, shap_row, _ = self._entries.pop(key)
+        self._bytes -= self._size(key, shap_row)
+
+    @staticmethod
+    def _size(key: bytes, shap_row: Optional[bytes]) -> int:
+        return sys.getsizeof(key) + (sys.getsizeof(shap_row) if shap_row is not None else 0) + _ENTRY_OVERHEAD
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "policy": self.policy,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+def create_cache() -> Optional[PredictionCache]:
+    return PredictionCache() if PREDICTION_CACHE_ENABLED else None
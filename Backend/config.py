@@ -0,0 +1,82 @@
+import os
+
+# runtime settings, overridable through environment variables
+
+# streaming ingestion
+STREAM_CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", "10000"))
+
+# response compression: result bodies of at least COMPRESS_MIN_BYTES are zstd
+# or gzip compressed when the client's Accept-Encoding allows it
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "1"))
+ZSTD_LEVEL = int(os.environ.get("ZSTD_LEVEL", "3"))
+
+# inference
+PREDICTION_THRESHOLD = float(os.environ.get("PREDICTION_THRESHOLD", "0.5"))
+# default explanation algorithm, exact or approx (see explanations.py)
+EXPLAIN_METHOD = os.environ.get("EXPLAIN_METHOD", "exact")
+
+# micro-batching of concurrent /predict requests
+BATCHING_ENABLED = os.environ.get("BATCHING_ENABLED", "1") == "1"
+BATCH_MAX_ROWS = int(os.environ.get("BATCH_MAX_ROWS", "2048"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "2"))
+
+# worker pool for CPU-bound stages: "thread", "process" (spawned workers that
+# each load the model) or "fork" (workers forked with the model already loaded)
+WORKER_POOL = os.environ.get("WORKER_POOL", "thread")
+WORKER_COUNT = int(os.environ.get("WORKER_COUNT", str(os.cpu_count() or 1)))
+MAX_PENDING_REQUESTS = int(os.environ.get("MAX_PENDING_REQUESTS", "64"))
+
+# batches up to this many rows are scored with the flattened tree engine
+# instead of xgboost; 0 disables it
+FLAT_ENGINE_MAX_ROWS = int(os.environ.get("FLAT_ENGINE_MAX_ROWS", "32"))
+
+# model artifact; the precomputed artifact directory, relative to the model
+# file, is built with `python artifact.py` and used when it matches the model
+MODEL_PATH = os.environ.get("MODEL_PATH", "model.json")
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "artifact")
+
+# per-row prediction cache keyed on the feature values and the model version;
+# policy is "lru" or "fifo", entries expire after the TTL
+PREDICTION_CACHE_ENABLED = os.environ.get("PREDICTION_CACHE_ENABLED", "1") == "1"
+PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get("PREDICTION_CACHE_MAX_ENTRIES", "100000"))
+PREDICTION_CACHE_MAX_MB = float(os.environ.get("PREDICTION_CACHE_MAX_MB", "64"))
+PREDICTION_CACHE_TTL_S = float(os.environ.get("PREDICTION_CACHE_TTL_S", "3600"))
+PREDICTION_CACHE_POLICY = os.environ.get("PREDICTION_CACHE_POLICY", "lru")
+
+# results of summary-mode /predict requests, kept in memory so single rows can
+# be listed and explained later; oldest results are dropped first
+RESULT_STORE_MAX_MB = float(os.environ.get("RESULT_STORE_MAX_MB", "32"))
+RESULT_STORE_TTL_S = float(os.environ.get("RESULT_STORE_TTL_S", "3600"))
+
+# what-if sweeps (POST /sensitivity): one base row varied over a grid of
+# feature values, at most this many scenarios per request
+SENSITIVITY_MAX_POINTS = int(os.environ.get("SENSITIVITY_MAX_POINTS", "10000"))
+
+# asynchronous batch jobs: uploads and per-chunk results are kept under JOB_DIR
+JOB_DIR = os.environ.get("JOB_DIR", "jobs")
+JOB_CHUNK_ROWS = int(os.environ.get("JOB_CHUNK_ROWS", "10000"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", "100"))
+
+# sampling profiler: requests slower than PROFILE_SLOW_MS get a collapsed-stack
+# profile written to PROFILE_DIR; 0 disables it
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+# model registry: one sub-directory per version under MODEL_DIR, each with a
+# model.json (and optionally its artifact); MODEL_PATH is served when MODEL_DIR
+# has no versions. MODEL_VERSION pins the active version, otherwise the last
+# version in sort order is active
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+MODEL_VERSION = os.environ.get("MODEL_VERSION") or None
+
+# drift monitoring: scored rows are counted into fixed bins per feature and
+# for the predicted probability, and compared to the training reference
+# (DRIFT_REFERENCE_FILE next to the model file, built by `python drift.py`).
+# Off by default: the bundled model.json has no reference, as its training
+# data is not in the repository; models from Training/train.py come with one
+DRIFT_ENABLED = os.environ.get("DRIFT_ENABLED", "0") == "1"
+DRIFT_BINS = int(os.environ.get("DRIFT_BINS", "10"))
+DRIFT_REFERENCE_FILE = os.environ.get("DRIFT_REFERENCE_FILE", "reference.json")
@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import DRIFT_ENABLED, DRIFT_BINS, DRIFT_REFERENCE_FILE, MODEL_PATH
+from features import final_features
+from registry import UnknownModelVersion, model_path
+
+logger = logging.getLogger("uvicorn.error")
+
+# histogram columns: the model features, then the predicted probability
+COLUMNS = final_features + ["probability"]
+
+# floor for empty bins, as in the training notebook's PSI
+_MIN_SHARE = 1e-6
+
+# rows binned per step, bounding the (rows, columns, cut points) comparison
+_BLOCK_ROWS = 4096
+
+def reference_path_for(model_path: str) -> str:
+    return os.path.join(os.path.dirname(model_path), DRIFT_REFERENCE_FILE)
+
+def bin_edges(X: np.ndarray, bins: int = DRIFT_BINS) -> np.ndarray:
+    # (n_columns, bins - 1) inner cut points at the reference deciles; the
+    # outer bins are open-ended, so values outside the training range count too
+    return np.percentile(X, np.linspace(0, 100, bins + 1)[1:-1], axis=0).T
+
+def histogram(X: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    # (n_columns, bins) counts of the rows of X; histograms on the same edges
+    # merge by adding their counts. A value's bin is the number of cut points
+    # at or below it, computed for all columns at once in row blocks
+    n_columns, bins = edges.shape[0], edges.shape[1] + 1
+    offsets = np.arange(n_columns) * bins
+    counts = np.zeros(n_columns * bins, dtype=np.int64)
+    for start in range(0, len(X), _BLOCK_ROWS):
+        block = X[start:start + _BLOCK_ROWS, :, None] >= edges
+        counts += np.bincount((block.sum(axis=2) + offsets).ravel(), minlength=counts.size)
+    return counts.reshape(n_columns, bins)
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    # population stability index per row of two (n_columns, bins) count arrays
+    expected = np.maximum(expected / expected.sum(axis=1, keepdims=True), _MIN_SHARE)
+    actual = np.maximum(actual / actual.sum(axis=1, keepdims=True), _MIN_SHARE)
+    return ((expected - actual) * np.log(expected / actual)).sum(axis=1)
+
+def build_reference(X: np.ndarray, probabilities: np.ndarray, bins: int = DRIFT_BINS,
+                    features: List[str] = final_features) -> Dict:
+    # X has one column per feature, in the order of features
+    X = np.column_stack([X, probabilities])
+    edges = bin_edges(X, bins)
+    return {"columns": list(features) + ["probability"], "rows": len(X), "edges": edges.tolist(),
+            "counts": histogram(X, edges).tolist()}
+
+def load_reference(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            reference = json.load(f)
+    except FileNotFoundError:
+        return None
+    if reference["columns"] != COLUMNS:
+        logger.warning(f"Drift reference {path} has different columns than the model, ignoring it.")
+        return None
+    return reference
+
+class DriftMonitor:
+    # constant-memory histograms of the rows scored since start-up or the
+    # last reset, on the bin edges of the training reference; no rows are kept
+    def __init__(self, reference: Dict):
+        self.edges = np.asarray(reference["edges"], dtype=np.float64)
+        self.reference = np.asarray(reference["counts"], dtype=np.int64)
+        self.reference_rows = reference["rows"]
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = np.zeros_like(self.reference)
+            self.rows = 0
+            self.since = time.time()
+
+    def observe(self, X: np.ndarray, probabilities: np.ndarray):
+        counts = histogram(np.column_stack([X, probabilities]), self.edges)
+        with self._lock:
+            self.counts += counts
+            self.rows += len(X)
+
+    def report(self) -> Dict:
+        with self._lock:
+            counts, rows, since = self.counts.copy(), self.rows, self.since
+        values = psi(self.reference, counts) if rows else np.full(len(COLUMNS), np.nan)
+        return {
+            "rows": rows,
+            "since": since,
+            "reference_rows": self.reference_rows,
+            "max_psi": None if not rows else float(values.max()),
+            "psi": {column: None if not rows else float(value) for column, value in zip(COLUMNS, values)},
+        }
+
+class DriftTracker:
+    # one monitor per model version that has a reference next to its model file
+    def __init__(self, enabled: bool = DRIFT_ENABLED):
+        self.enabled = enabled
+        self._monitors: Dict[str, Optional[DriftMonitor]] = {}
+        self._lock = threading.Lock()
+
+    def monitor(self, version: str) -> Optional[DriftMonitor]:
+        if not self.enabled:
+            return None
+        if version not in self._monitors:
+            with self._lock:
+                if version not in self._monitors:
+                    try:
+                        reference = load_reference(reference_path_for(model_path(version)))
+                    except UnknownModelVersion:
+                        reference = None
+                    self._monitors[version] = DriftMonitor(reference) if reference is not None else None
+        return self._monitors[version]
+
+    def observe(self, version: str, X: np.ndarray, probabilities: np.ndarray):
+        monitor = self.monitor(version)
+        if monitor is not None:
+            monitor.observe(X, probabilities)
+
+# usage: python drift.py training.csv [model.json] [bins]
+#   writes the reference histograms of the training rows and the model's
+#   probabilities on them next to the model file
+if __name__ == "__main__":
+    import sys
+
+    import pandas as pd
+
+    from workers import load_engine
+
+    data_path = sys.argv[1]
+    model_file = sys.argv[2] if len(sys.argv) > 2 else MODEL_PATH
+    bins = int(sys.argv[3]) if len(sys.argv) > 3 else DRIFT_BINS
+    df = pd.read_csv(data_path)
+    df.columns = df.columns.str.strip()
+    X = df[final_features].to_numpy(dtype=np.float64)
+    _, probabilities, _ = load_engine(model_file).predict(X, explain=False)
+    out_path = reference_path_for(model_file)
+    with open(out_path, "w") as f:
+        json.dump(build_reference(X, probabilities, bins), f)
+    print(f"drift reference of {len(X)} rows written to {out_path}")
@@ -0,0 +1,59 @@
+from typing import Dict, List, Literal, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+from features import final_features
+
+# explanation modes:
+#   full   - one {feature: shap} dict per row (original response format)
+#   matrix - feature-name header plus a row-major SHAP matrix
+#   topk   - per row, the k features with the largest |SHAP|
+#   none   - SHAP is skipped entirely
+ExplainMode = Literal["full", "matrix", "topk", "none"]
+
+# explanation algorithms, on 1000 rows of Training/inference_test.csv:
+#   exact  - path-dependent TreeSHAP, xgboost's pred_contribs, the values
+#            shap.TreeExplainer returns (about 1.4 s per 1000 rows)
+#   approx - Saabas attribution, xgboost's approx_contribs: each split's change
+#            in expected value is credited to its feature along the row's path.
+#            About 20x faster than exact, still sums to the margin; mean
+#            |error| 0.12 against a mean |SHAP| of 0.54, same top feature for
+#            77% of rows, 84% overlap of the top 5
+ExplainMethod = Literal["exact", "approx"]
+
+# schemas / data contracts
+class ShapMatrix(BaseModel):
+    features: List[str]
+    values: List[List[float]]
+
+class ShapTopK(BaseModel):
+    features: List[str]
+    indices: List[List[int]]
+    values: List[List[float]]
+
+def top_k_indices(values: np.ndarray, k: int) -> np.ndarray:
+    # indices of the k largest |values| per row, ordered by decreasing magnitude
+    k = min(k, values.shape[1])
+    magnitude = np.abs(values)
+    idx = np.argpartition(-magnitude, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(magnitude, idx, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1)
+
+def serialize_shap(values: Optional[np.ndarray], mode: ExplainMode, top_k: int = 5) -> Dict:
+    # builds the explanation fields of the response from an (n_rows, n_features)
+    # array; matrices stay arrays for formats.dumps, as float64 so the numbers
+    # are written as before
+    if mode == "none" or values is None:
+        return {}
+    values = np.asarray(values, dtype=np.float64)
+    if mode == "matrix":
+        return {"shap_matrix": {"features": final_features, "values": values}}
+    if mode == "topk":
+        idx = top_k_indices(values, top_k)
+        return {"shap_top_k": {
+            "features": final_features,
+            "indices": idx,
+            "values": np.take_along_axis(values, idx, axis=1)
+        }}
+    return {"shap_values": [dict(zip(final_features, row)) for row in values.tolist()]}
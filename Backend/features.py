@@ -0,0 +1,68 @@
+# list of features for model input
+final_features = [
+    'Quick Ratio',
+    'Fixed Assets to Assets',
+    'Interest-bearing debt interest rate',
+    'Total debt/Total net worth',
+    'Borrowing dependency',
+    'ROA(C) before interest and depreciation before interest',
+    'Continuous Net Profit Growth Rate',
+    'Research and development expense rate',
+    'Allocation rate per person',
+    'Revenue per person',
+    'Cash/Current Liability',
+    'Accounts Receivable Turnover',
+    'Quick Assets/Total Assets',
+    'Total income/Total expense',
+    'Net Value Per Share (B)',
+    'Cash Flow to Equity',
+    'Non-industry income and expenditure/revenue',
+    'After-tax Net Profit Growth Rate',
+    'Inventory Turnover Rate (times)',
+    'Total expense/Assets',
+    'Net Value Growth Rate',
+    'Operating Expense Rate',
+    'Total Asset Growth Rate',
+    'Cash Turnover Rate',
+    'Current Liabilities/Liability',
+    'Interest Expense Ratio',
+    'Operating Profit Growth Rate',
+    'Long-term fund suitability ratio (A)',
+    'Cash Flow Per Share',
+    'Average Collection Days'
+]
+
+# validation groups for input value ranges
+features_0_1 = [
+    'Borrowing dependency',
+    'ROA(C) before interest and depreciation before interest',
+    'Continuous Net Profit Growth Rate',
+    'Current Liabilities/Liability',
+    'Interest Expense Ratio',
+    'Operating Profit Growth Rate',
+    'Long-term fund suitability ratio (A)',
+    'Cash Flow Per Share'
+]
+features_0_1e10 = [
+    'Quick Ratio',
+    'Fixed Assets to Assets',
+    'Interest-bearing debt interest rate',
+    'Total debt/Total net worth',
+    'Research and development expense rate',
+    'Allocation rate per person',
+    'Revenue per person',
+    'Accounts Receivable Turnover',
+    'Quick Assets/Total Assets',
+    'Total income/Total expense',
+    'Net Value Per Share (B)',
+    'Cash Flow to Equity',
+    'Non-industry income and expenditure/revenue',
+    'After-tax Net Profit Growth Rate',
+    'Inventory Turnover Rate (times)',
+    'Total expense/Assets',
+    'Net Value Growth Rate',
+    'Operating Expense Rate',
+    'Total Asset Growth Rate',
+    'Cash Turnover Rate',
+    'Average Collection Days'
+]
@@ -0,0 +1,131 @@
+import gzip
+import io
+import json
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import orjson
+import zstandard
+
+from config import COMPRESS_MIN_BYTES, GZIP_LEVEL, ZSTD_LEVEL
+from explanations import ExplainMode, top_k_indices
+from features import final_features
+
+# response media types, negotiated through the Accept header
+JSON = "application/json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+NPZ = "application/x-npz"
+
+BINARY_MEDIA_TYPES = {ARROW_STREAM: ARROW_STREAM, PARQUET: PARQUET, "application/x-parquet": PARQUET, NPZ: NPZ}
+
+# content codings, negotiated through the Accept-Encoding header, in order of preference
+ENCODINGS = ["zstd", "gzip"]
+
+def _weights(header: Optional[str]) -> Dict[str, float]:
+    # q-value of each entry of an Accept or Accept-Encoding header, in header order
+    weights = {}
+    for part in (header or "").split(","):
+        value, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if value:
+            weights[value.lower()] = q
+    return weights
+
+def negotiate(accept: Optional[str]) -> str:
+    # supported type with the highest q-value, the first listed on ties; JSON
+    # for wildcards and when no supported type is accepted
+    best, best_q = JSON, 0.0
+    for media_type, q in _weights(accept).items():
+        if media_type in (JSON, "application/*", "*/*"):
+            supported = JSON
+        else:
+            supported = BINARY_MEDIA_TYPES.get(media_type)
+        if supported is not None and q > best_q:
+            best, best_q = supported, q
+    return best
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    # supported coding with the highest q-value, the preferred one on ties;
+    # None when the client accepts neither
+    accepted = _weights(accept_encoding)
+    best, best_q = None, 0.0
+    for coding in ENCODINGS:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def compress(body: bytes, media_type: str, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    # body in the negotiated coding, and the coding; small bodies and parquet,
+    # which is compressed already, are sent as they are
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES or media_type == PARQUET:
+        return body, None
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), encoding
+    return gzip.compress(body, GZIP_LEVEL, mtime=0), encoding
+
+def _default(obj):
+    # arrays orjson does not write from their buffer, e.g. non-contiguous slices
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError
+
+def dumps(content: Any) -> bytes:
+    # JSON with numpy arrays written straight from their buffers, without
+    # building python lists or validating against the response model
+    return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def results_table(predictions: np.ndarray, probabilities: np.ndarray, shap_values: Optional[np.ndarray],
+                  explain: ExplainMode, top_k: int):
+    import pyarrow as pa
+
+    # one column per output; SHAP is either one column per feature or, for
+    # top-k, fixed-size list columns of feature indices and values
+    columns = {
+        "prediction": pa.array(predictions, type=pa.int8()),
+        "probability": pa.array(probabilities, type=pa.float64()),
+    }
+    if shap_values is not None and explain == "topk":
+        idx = top_k_indices(shap_values, top_k)
+        k = idx.shape[1]
+        columns["shap_top_k_indices"] = pa.FixedSizeListArray.from_arrays(pa.array(idx.ravel(), type=pa.int32()), k)
+        columns["shap_top_k_values"] = pa.FixedSizeListArray.from_arrays(
+            pa.array(np.take_along_axis(shap_values, idx, axis=1).ravel()), k)
+    elif shap_values is not None and explain != "none":
+        for j, feature in enumerate(final_features):
+            columns[f"shap_{feature}"] = pa.array(shap_values[:, j])
+    return pa.table(columns).replace_schema_metadata({"features": json.dumps(final_features)})
+
+def encode(media_type: str, predictions: np.ndarray, probabilities: np.ndarray, shap_values: Optional[np.ndarray],
+           explain: ExplainMode, top_k: int) -> bytes:
+    sink = io.BytesIO()
+    if media_type == NPZ:
+        arrays = {"predictions": predictions, "probabilities": probabilities, "features": np.array(final_features)}
+        if shap_values is not None and explain == "topk":
+            idx = top_k_indices(shap_values, top_k)
+            arrays["shap_top_k_indices"] = idx
+            arrays["shap_top_k_values"] = np.take_along_axis(shap_values, idx, axis=1)
+        elif shap_values is not None and explain != "none":
+            arrays["shap_values"] = shap_values
+        np.savez(sink, **arrays)
+        return sink.getvalue()
+
+    # pyarrow is imported on first use to keep start-up fast
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = results_table(predictions, probabilities, shap_values, explain, top_k)
+    if media_type == PARQUET:
+        pq.write_table(table, sink)
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue()
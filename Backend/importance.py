@@ -0,0 +1,59 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import xgboost as xgb
+
+from config import MODEL_PATH
+from features import final_features
+
+# global feature importances of a model: mean |SHAP| per feature over a
+# background data set, computed once next to the model file instead of per upload
+IMPORTANCE_FILE = "importance.json"
+
+# rows explained per block, bounding the SHAP matrix held at once
+_BLOCK_ROWS = 10000
+
+def importance_path_for(model_path: str) -> str:
+    return os.path.join(os.path.dirname(model_path), IMPORTANCE_FILE)
+
+def build_importance(booster: xgb.Booster, X: np.ndarray, features: List[str] = final_features) -> Dict:
+    # X has one column per feature, in the order of features; exact SHAP
+    totals = np.zeros(len(features))
+    for start in range(0, len(X), _BLOCK_ROWS):
+        dmatrix = xgb.DMatrix(X[start:start + _BLOCK_ROWS], feature_names=list(features))
+        totals += np.abs(booster.predict(dmatrix, pred_contribs=True, validate_features=False)[:, :-1]).sum(axis=0)
+    mean_abs = totals / len(X)
+    order = np.argsort(-mean_abs, kind="stable")
+    return {
+        "rows": len(X),
+        "features": [{"feature": features[i], "mean_abs_shap": float(mean_abs[i])} for i in order],
+    }
+
+def load_importance(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+# usage: python importance.py data.csv [model.json]
+#   writes the mean |SHAP| of the model on the rows of data.csv next to the model file
+if __name__ == "__main__":
+    import sys
+
+    import pandas as pd
+
+    data_path = sys.argv[1]
+    model_file = sys.argv[2] if len(sys.argv) > 2 else MODEL_PATH
+    df = pd.read_csv(data_path)
+    df.columns = df.columns.str.strip()
+    booster = xgb.Booster()
+    booster.load_model(model_file)
+    importance = build_importance(booster, df[final_features].to_numpy(dtype=np.float32))
+    importance["source"] = os.path.basename(data_path)
+    out_path = importance_path_for(model_file)
+    with open(out_path, "w") as f:
+        json.dump(importance, f, indent=2)
+    print(f"importances over {importance['rows']} rows written to {out_path}")
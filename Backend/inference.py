@@ -0,0 +1,69 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from config import PREDICTION_THRESHOLD, FLAT_ENGINE_MAX_ROWS
+from features import final_features
+from metrics import stage
+from tree_engine import FlatTreeEnsemble
+
+class InferenceEngine:
+    # builds the input matrix once per batch, computes margins once and derives
+    # labels and probabilities from them; SHAP reuses the same DMatrix
+    def __init__(self, booster: xgb.Booster, threshold: float = PREDICTION_THRESHOLD,
+                 flat: Optional[FlatTreeEnsemble] = None, flat_max_rows: int = FLAT_ENGINE_MAX_ROWS,
+                 version: str = "", model_hash: str = ""):
+        self.booster = booster
+        # registry version name, and the model file hash that cache keys are scoped to
+        self.version = version
+        self.model_hash = model_hash
+        self.threshold = threshold
+        self.flat = flat
+        self.flat_max_rows = flat_max_rows
+
+    def as_matrix(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            if list(X.columns) != final_features:
+                X = X[final_features]
+            X = X.to_numpy(dtype=np.float32)
+        return X
+
+    def to_dmatrix(self, X) -> xgb.DMatrix:
+        if isinstance(X, xgb.DMatrix):
+            return X
+        # C-contiguous float32 arrays are read by xgboost without a copy
+        return xgb.DMatrix(self.as_matrix(X), feature_names=final_features)
+
+    def margins(self, dmatrix: xgb.DMatrix) -> np.ndarray:
+        return self.booster.predict(dmatrix, output_margin=True, validate_features=False)
+
+    def predict(self, X, explain: bool = True, timings: Optional[Dict[str, float]] = None,
+                method: str = "exact") -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        dmatrix = None
+        with stage(timings, "predict"):
+            if self.flat is not None and not isinstance(X, xgb.DMatrix) and len(X) <= self.flat_max_rows:
+                # small batches skip DMatrix setup and library dispatch
+                margins = self.flat.margins(self.as_matrix(X))
+            else:
+                dmatrix = self.to_dmatrix(X)
+                margins = self.margins(dmatrix)
+            probabilities = 1.0 / (1.0 + np.exp(-margins.astype(np.float64)))
+            predictions = (probabilities > self.threshold).astype(np.int64)
+
+        shap_values = None
+        if explain:
+            with stage(timings, "explain"):
+                shap_values = self.explain(dmatrix if dmatrix is not None else X, method)
+        return predictions, probabilities, shap_values
+
+    def explain(self, X, method: str = "exact") -> np.ndarray:
+        dmatrix = self.to_dmatrix(X)
+        if method == "approx":
+            # Saabas attribution along each row's path, no TreeSHAP subset weighting
+            return self.booster.predict(dmatrix, pred_contribs=True, approx_contribs=True,
+                                        validate_features=False)[:, :-1]
+        # shap.TreeExplainer computes path-dependent SHAP for xgboost models with
+        # this same call, so shap itself is not needed; the last column is the bias
+        return self.booster.predict(dmatrix, pred_contribs=True, validate_features=False)[:, :-1]
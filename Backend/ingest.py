@@ -0,0 +1,153 @@
+import logging
+from typing import IO, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from features import final_features
+
+logger = logging.getLogger("uvicorn.error")
+
+_feature_set = set(final_features)
+_feature_dtypes = {feature: np.float64 for feature in final_features}
+
+# only the model columns are parsed, straight into float64
+def read_features(source: IO, chunksize: Optional[int] = None):
+    return pd.read_csv(
+        source,
+        usecols=lambda column: column in _feature_set,
+        dtype=_feature_dtypes,
+        chunksize=chunksize,
+    )
+
+def check_columns(df: pd.DataFrame) -> pd.DataFrame:
+    missing = [feature for feature in final_features if feature not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required columns: {missing}")
+    return df[final_features]
+
+# messages of the ValueErrors pandas raises when a cell cannot be parsed as a float
+_dtype_errors = ("could not convert string to float", "cannot safely convert passed user dtype",
+                 "Unable to parse string")
+
+def _read_error(e: Exception) -> HTTPException:
+    if isinstance(e, pd.errors.EmptyDataError):
+        return HTTPException(status_code=400, detail="The uploaded file is empty.")
+    if isinstance(e, (pd.errors.ParserError, UnicodeDecodeError)):
+        return HTTPException(status_code=400, detail="Invalid CSV format. Please upload a valid CSV file.")
+    if isinstance(e, ValueError) and str(e).startswith(_dtype_errors):
+        return HTTPException(status_code=400, detail="All input values must be floats.")
+    logger.exception("Error reading CSV file.")
+    return HTTPException(status_code=500, detail="Internal server error while reading the file.")
+
+def read_csv(source: IO) -> pd.DataFrame:
+    try:
+        df = read_features(source)
+    except Exception as e:
+        raise _read_error(e)
+    return check_columns(df)
+
+def iter_csv_chunks(source: IO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    # the first chunk is read eagerly so header and format errors surface
+    # before the response starts streaming
+    try:
+        reader = read_features(source, chunksize=chunk_rows)
+        first = next(reader)
+    except StopIteration:
+        raise HTTPException(status_code=400, detail="The uploaded file is empty.")
+    except Exception as e:
+        raise _read_error(e)
+    first = check_columns(first)
+
+    def chunks():
+        yield first
+        while True:
+            try:
+                chunk = next(reader)
+            except StopIteration:
+                return
+            except Exception as e:
+                raise _read_error(e)
+            yield chunk[final_features]
+
+    return chunks()
+
+# binary columnar formats; pyarrow is imported on first use to keep start-up fast
+ARROW_MEDIA_TYPES = {"application/vnd.apache.arrow.file", "application/vnd.apache.arrow.stream"}
+PARQUET_MEDIA_TYPES = {"application/vnd.apache.parquet", "application/x-parquet"}
+NPY_MEDIA_TYPES = {"application/x-npy"}
+
+ARROW_EXTENSIONS = (".arrow", ".arrows", ".feather", ".ipc")
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+NPY_EXTENSIONS = (".npy",)
+
+def upload_format(content_type: Optional[str], filename: Optional[str]) -> str:
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    filename = (filename or "").lower()
+    if content_type in ARROW_MEDIA_TYPES or filename.endswith(ARROW_EXTENSIONS):
+        return "arrow"
+    if content_type in PARQUET_MEDIA_TYPES or filename.endswith(PARQUET_EXTENSIONS):
+        return "parquet"
+    if content_type in NPY_MEDIA_TYPES or filename.endswith(NPY_EXTENSIONS):
+        return "npy"
+    return "csv"
+
+def _table_to_frame(table) -> pd.DataFrame:
+    import pyarrow as pa
+
+    missing = [feature for feature in final_features if feature not in table.column_names]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required columns: {missing}")
+    table = table.select(final_features)
+    try:
+        table = table.cast(pa.schema([(feature, pa.float64()) for feature in final_features]))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        raise HTTPException(status_code=400, detail="All input values must be floats.")
+    # float64 columns without nulls are converted without copying
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def read_arrow(source: IO) -> pd.DataFrame:
+    import pyarrow as pa
+
+    # the IPC file format starts with a magic string, the stream format does not
+    magic = source.read(6)
+    source.seek(0)
+    try:
+        if magic == b"ARROW1":
+            table = pa.ipc.open_file(source).read_all()
+        else:
+            table = pa.ipc.open_stream(source).read_all()
+    except pa.ArrowInvalid:
+        raise HTTPException(status_code=400, detail="Invalid Arrow IPC data.")
+    return _table_to_frame(table)
+
+def read_parquet(source: IO) -> pd.DataFrame:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    try:
+        parquet_file = pq.ParquetFile(source)
+        columns = [feature for feature in final_features if feature in parquet_file.schema_arrow.names]
+        # only the model columns are read from disk
+        table = parquet_file.read(columns=columns)
+    except pa.ArrowInvalid:
+        raise HTTPException(status_code=400, detail="Invalid Parquet file.")
+    return _table_to_frame(table)
+
+def read_npy(source: IO) -> pd.DataFrame:
+    # a 2-D float array with the columns in final_features order
+    try:
+        X = np.load(source, allow_pickle=False)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid NumPy file.")
+    if X.ndim != 2 or X.shape[1] != len(final_features):
+        raise HTTPException(status_code=400, detail=f"NumPy input must have shape (rows, {len(final_features)}).")
+    if X.dtype.kind != "f":
+        raise HTTPException(status_code=400, detail="All input values must be floats.")
+    return pd.DataFrame(X, columns=final_features, copy=False)
+
+_readers = {"arrow": read_arrow, "parquet": read_parquet, "npy": read_npy, "csv": read_csv}
+
+def read_upload(source: IO, content_type: Optional[str], filename: Optional[str]) -> pd.DataFrame:
+    return _readers[upload_format(content_type, filename)](source)
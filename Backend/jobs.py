@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from typing import IO, Any, Iterator, Literal, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from config import JOB_DIR, JOB_CHUNK_ROWS, JOB_WORKERS, JOB_MAX_QUEUED
+from explanations import ExplainMethod, ExplainMode
+from formats import results_table
+from features import final_features
+from ingest import iter_csv_chunks, read_upload, upload_format
+from workers import WorkerPool
+
+logger = logging.getLogger("uvicorn.error")
+
+JobState = Literal["queued", "running", "completed", "failed"]
+
+# schemas / data contracts
+class JobStatus(BaseModel):
+    id: str
+    status: JobState
+    explain: ExplainMode
+    explain_method: ExplainMethod = "exact"
+    model_version: str
+    chunk_rows: int
+    total_rows: Optional[int] = None
+    rows_done: int = 0
+    chunks_done: int = 0
+    created_at: float
+    updated_at: float
+    error: Optional[Any] = None
+
+class JobQueueFull(Exception):
+    pass
+
+# on-disk layout, one directory per job:
+#   job.json          - JobStatus, replaced atomically after every chunk
+#   input             - the uploaded file, as received
+#   upload.json       - content type and filename of the upload
+#   results/NNNNNN.arrow - one Arrow IPC file per completed chunk
+# a chunk counts as completed once its result file exists, so an interrupted
+# job resumes from the first chunk without one
+class JobStore:
+    def __init__(self, root: str = JOB_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, job_id: str, *parts: str) -> str:
+        return os.path.join(self.root, job_id, *parts)
+
+    def create(self, source: IO, content_type: Optional[str], filename: Optional[str],
+               explain: ExplainMode, explain_method: ExplainMethod, model_version: str,
+               chunk_rows: int) -> JobStatus:
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.path(job_id, "results"))
+        with open(self.path(job_id, "input"), "wb") as f:
+            shutil.copyfileobj(source, f, 1 << 20)
+        now = time.time()
+        job = JobStatus(id=job_id, status="queued", explain=explain, explain_method=explain_method,
+                        model_version=model_version, chunk_rows=chunk_rows, created_at=now, updated_at=now)
+        self._write(self.path(job_id, "upload.json"), json.dumps({"content_type": content_type, "filename": filename}))
+        self.save(job)
+        return job
+
+    def load(self, job_id: str) -> Optional[JobStatus]:
+        # job ids are uuid hex strings, anything else cannot name a job directory
+        if len(job_id) != 32 or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        try:
+            with open(self.path(job_id, "job.json")) as f:
+                return JobStatus.model_validate_json(f.read())
+        except FileNotFoundError:
+            return None
+
+    def save(self, job: JobStatus):
+        job.updated_at = time.time()
+        self._write(self.path(job.id, "job.json"), job.model_dump_json())
+
+    def delete(self, job_id: str):
+        shutil.rmtree(self.path(job_id), ignore_errors=True)
+
+    def unfinished(self) -> Iterator[JobStatus]:
+        for job_id in sorted(os.listdir(self.root)):
+            job = self.load(job_id)
+            if job is not None and job.status in ("queued", "running"):
+                yield job
+
+    def upload(self, job_id: str) -> Tuple[Optional[str], Optional[str]]:
+        with open(self.path(job_id, "upload.json")) as f:
+            upload = json.load(f)
+        return upload["content_type"], upload["filename"]
+
+    def chunk_path(self, job_id: str, index: int) -> str:
+        return self.path(job_id, "results", f"{index:06d}.arrow")
+
+    def write_chunk(self, job_id: str, index: int, predictions: np.ndarray, probabilities: np.ndarray,
+                    shap_values: Optional[np.ndarray]):
+        import pyarrow as pa
+
+        table = results_table(predictions, probabilities, shap_values, "matrix", len(final_features))
+        path = self.chunk_path(job_id, index)
+        with pa.OSFile(path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(path + ".tmp", path)
+
+    def read_rows(self, job: JobStatus, offset: int, limit: int):
+        # predictions, probabilities and SHAP (or None) of completed rows
+        # [offset, offset + limit), read from the chunk files they fall in
+        import pyarrow as pa
+
+        end = min(offset + limit, job.rows_done)
+        if end <= offset:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), None
+
+        tables = []
+        for index in range(offset // job.chunk_rows, (end - 1) // job.chunk_rows + 1):
+            with pa.memory_map(self.chunk_path(job.id, index)) as source:
+                table = pa.ipc.open_file(source).read_all()
+            start = index * job.chunk_rows
+            lo, hi = max(offset - start, 0), min(end - start, table.num_rows)
+            tables.append(table.slice(lo, hi - lo))
+        table = pa.concat_tables(tables)
+
+        predictions = table.column("prediction").to_numpy().astype(np.int64)
+        probabilities = table.column("probability").to_numpy()
+        shap_columns = [f"shap_{feature}" for feature in final_features]
+        shap_values = None
+        if shap_columns[0] in table.column_names:
+            shap_values = np.column_stack([table.column(c).to_numpy() for c in shap_columns])
+        return predictions, probabilities, shap_values
+
+    @staticmethod
+    def _write(path: str, content: str):
+        with open(path + ".tmp", "w") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+
+class JobRunner:
+    # background threads that score queued jobs chunk by chunk on the worker
+    # pool; unfinished jobs found on disk at start-up are resumed
+    def __init__(self, pool: WorkerPool, store: Optional[JobStore] = None, workers: int = JOB_WORKERS,
+                 max_queued: int = JOB_MAX_QUEUED):
+        self.pool = pool
+        self.store = store if store is not None else JobStore()
+        self.max_queued = max_queued
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        for job in self.store.unfinished():
+            logger.info(f"Resuming job {job.id} at chunk {job.chunks_done}.")
+            self._queue.put(job.id)
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"jobs-{i}", daemon=True).start()
+
+    def submit(self, source: IO, content_type: Optional[str], filename: Optional[str],
+               explain: ExplainMode, explain_method: ExplainMethod, model_version: str,
+               chunk_rows: int = JOB_CHUNK_ROWS) -> JobStatus:
+        # the model version is fixed at submission, so a resumed job finishes on it
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFull()
+        job = self.store.create(source, content_type, filename, explain, explain_method, model_version, chunk_rows)
+        self._queue.put(job.id)
+        return job
+
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            # deleted while queued
+            job = self.store.load(job_id)
+            if job is None:
+                continue
+            try:
+                self._process(job)
+            except HTTPException as e:
+                self._fail(job, e.detail)
+            except Exception as e:
+                logger.exception(f"Job {job.id} failed: {str(e)}")
+                self._fail(job, "Internal error during prediction.")
+
+    def _fail(self, job: JobStatus, error):
+        job.status, job.error = "failed", error
+        try:
+            self.store.save(job)
+        except OSError as e:
+            logger.error(f"Could not record failure of job {job.id}: {str(e)}")
+
+    def _chunks(self, job: JobStatus) -> Iterator[pd.DataFrame]:
+        content_type, filename = self.store.upload(job.id)
+        with open(self.store.path(job.id, "input"), "rb") as source:
+            if upload_format(content_type, filename) == "csv":
+                yield from iter_csv_chunks(source, job.chunk_rows)
+                return
+            df = read_upload(source, content_type, filename)
+        for start in range(0, len(df), job.chunk_rows):
+            yield df.iloc[start:start + job.chunk_rows]
+
+    def _count_rows(self, job: JobStatus) -> Optional[int]:
+        # data lines of a CSV upload, so progress can be reported as a fraction
+        content_type, filename = self.store.upload(job.id)
+        if upload_format(content_type, filename) != "csv":
+            return None
+        lines, last = 0, b"\n"
+        with open(self.store.path(job.id, "input"), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                lines += block.count(b"\n")
+                last = block[-1:]
+        return max(lines + (last != b"\n") - 1, 0)
+
+    def _process(self, job: JobStatus):
+        job.status = "running"
+        if job.total_rows is None:
+            job.total_rows = self._count_rows(job)
+        self.store.save(job)
+
+        explain = job.explain != "none"
+        for index, df in enumerate(self._chunks(job)):
+            offset = index * job.chunk_rows
+            # completed chunks are still parsed on resume, but not scored again
+            if os.path.exists(self.store.chunk_path(job.id, index)):
+                job.rows_done, job.chunks_done = offset + len(df), index + 1
+                continue
+
+            result = self.pool.score_sync([df], [explain], job.model_version, job.explain_method)[0]
+            if not result.input_report.success:
+                for failure in result.input_report.failures:
+                    if failure["row"] is not None:
+                        failure["row"] += offset
+                return self._fail(job, {
+                    "message": "Input data validation failed.",
+                    "offset": offset,
+                    "failed_rows": result.input_report.failed_rows,
+                    "failures": result.input_report.failures,
+                })
+            if not result.output_report.success:
+                logger.error(f"Output data validation failed: {result.output_report.failures}")
+                return self._fail(job, "Output data validation failed.")
+
+            self.store.write_chunk(job.id, index, result.predictions, result.probabilities, result.shap_values)
+            job.rows_done, job.chunks_done = offset + len(df), index + 1
+            self.store.save(job)
+
+        job.status, job.total_rows = "completed", job.rows_done
+        self.store.save(job)
@@ -1,20 +1,67 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Header, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import numpy as np
 import pandas as pd
-import io
-from xgboost import XGBClassifier
+import shutil
+import tempfile
+import time
 from pydantic import BaseModel
-import great_expectations as ge
-from great_expectations.core.expectation_suite import ExpectationSuite
-from typing import List, Dict
+from typing import IO, List, Dict, Iterator, Literal, Optional, Union
 import logging
-import shap
 from fastapi.middleware.cors import CORSMiddleware 
+from batching import MicroBatcher
+from config import STREAM_CHUNK_ROWS, BATCHING_ENABLED, JOB_CHUNK_ROWS, EXPLAIN_METHOD
+from drift import DriftTracker
+from explanations import ExplainMethod, ExplainMode, ShapMatrix, ShapTopK, serialize_shap
+from features import final_features
+from formats import JSON, ARROW_STREAM, PARQUET, NPZ, compress, dumps, negotiate, encode
+from importance import importance_path_for, load_importance
+from ingest import read_upload, iter_csv_chunks
+from jobs import JobQueueFull, JobRunner, JobStatus
+import metrics
+from metrics import REQUEST_ROWS, add_request_timings, timed
+from profiler import create_profiler
+from registry import ModelRegistry, UnknownModelVersion
+from results import (PredictSummary, ResultRowsPage, ResultStore, RiskBandName, RowExplanation, select_rows,
+                     summarize)
+from sensitivity import SensitivityCurves, SensitivityRequest, base_row, grid
+from workers import PoolSaturated, ScoreResult, WorkerPool, explain_rows, score_scenarios
 
 # schemas / data contracts
 class PredictReturnModel(BaseModel):
+    model_version: str
     predictions: List[int]
     probabilities: List[float]
-    shap_values: List[Dict[str, float]]
+    shap_values: Optional[List[Dict[str, float]]] = None
+    shap_matrix: Optional[ShapMatrix] = None
+    shap_top_k: Optional[ShapTopK] = None
+
+class FeatureImportance(BaseModel):
+    feature: str
+    mean_abs_shap: float
+
+class GlobalImportance(BaseModel):
+    model_version: str
+    # rows of the background data set the mean is taken over
+    rows: int
+    source: Optional[str] = None
+    features: List[FeatureImportance]
+
+class JobResultsPage(PredictReturnModel):
+    offset: int
+    # omitted on the last page of a finished job
+    next_offset: Optional[int] = None
+
+# result routes send bodies built by encoded_response; their response_model
+# documents the JSON, this the compression
+ENCODED_RESPONSE_HEADERS = {
+    "Content-Encoding": {
+        "description": "Compression negotiated through Accept-Encoding, absent for small bodies.",
+        "schema": {"type": "string", "enum": ["zstd", "gzip"]},
+    },
+}
 
 # initialize FastAPI
 app = FastAPI()
@@ -28,199 +75,534 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# list of features for model input
-final_features = [
-    'Quick Ratio',
-    'Fixed Assets to Assets',
-    'Interest-bearing debt interest rate',
-    'Total debt/Total net worth',
-    'Borrowing dependency',
-    'ROA(C) before interest and depreciation before interest',
-    'Continuous Net Profit Growth Rate',
-    'Research and development expense rate',
-    'Allocation rate per person',
-    'Revenue per person',
-    'Cash/Current Liability',
-    'Accounts Receivable Turnover',
-    'Quick Assets/Total Assets',
-    'Total income/Total expense',
-    'Net Value Per Share (B)',
-    'Cash Flow to Equity',
-    'Non-industry income and expenditure/revenue',
-    'After-tax Net Profit Growth Rate',
-    'Inventory Turnover Rate (times)',
-    'Total expense/Assets',
-    'Net Value Growth Rate',
-    'Operating Expense Rate',
-    'Total Asset Growth Rate',
-    'Cash Turnover Rate',
-    'Current Liabilities/Liability',
-    'Interest Expense Ratio',
-    'Operating Profit Growth Rate',
-    'Long-term fund suitability ratio (A)',
-    'Cash Flow Per Share',
-    'Average Collection Days'
-]
-
-# initialize model
-model = XGBClassifier()
-model.load_model("model.json")
-
-# Create a SHAP explainer once at startup
-explainer = shap.TreeExplainer(model)
+# model versions on disk and the active one
+registry = ModelRegistry()
+# initialize worker pool, which loads the active model once per worker;
+# other versions are loaded when first requested or activated
+pool = WorkerPool(version=registry.active)
+batcher = MicroBatcher(pool)
+# background job runner, resumes unfinished jobs found on disk
+jobs = JobRunner(pool)
+# opt-in sampling profiler for slow requests
+profiler = create_profiler()
+# feature and probability histograms of scored rows, per model version
+drift = DriftTracker()
+# results of summary-mode requests, for paging rows and explaining single rows
+results_store = ResultStore()
+
+# prometheus metrics besides the per-stage and per-request ones in metrics.py
+metrics.register("bankruptcy_batch_rows", "Rows per micro-batch.", batcher.batch_rows)
+metrics.register("bankruptcy_batch_requests", "Requests per micro-batch.", batcher.batch_requests)
+metrics.register("bankruptcy_batch_queue_wait_seconds", "Time requests wait for their micro-batch.", batcher.queue_wait)
+metrics.register("bankruptcy_batch_latency_seconds", "Latency of micro-batch model calls.", batcher.batch_latency)
+metrics.register("bankruptcy_pool_pending_requests", "Requests admitted to the worker pool.", lambda: pool.pending)
+metrics.register("bankruptcy_jobs_queued", "Batch jobs waiting to run.", jobs.queued)
+if drift.enabled:
+    metrics.register("bankruptcy_drift_max_psi", "Largest PSI of the active model version's inputs and output.",
+                     lambda: max_psi(registry.active))
+metrics.register("bankruptcy_process_pss_bytes", "Proportional set size of the API and worker processes.",
+                 metrics.GaugeFamily("process", lambda: process_memory("pss")))
+metrics.register("bankruptcy_process_uss_bytes", "Memory private to each of the API and worker processes.",
+                 metrics.GaugeFamily("process", lambda: process_memory("uss")))
 
 # initialize logger
 logger = logging.getLogger("uvicorn.error")
 
-# validation functions
-def validate_input(df: pd.DataFrame) -> bool:
-    context = ge.get_context()
-    expectation_suite_name = "input_suite"
+# instrumentation: latency and bytes per route, Server-Timing header with the
+# stages of the request, and a profile dump for slow requests when enabled
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    timings = metrics.start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    end = time.perf_counter()
 
-    try:
-        suite = context.get_expectation_suite(expectation_suite_name=expectation_suite_name)
-        logger.info(f"Loaded ExpectationSuite '{suite.name}' containing {len(suite.expectations)} expectations.")
-    except ge.exceptions.DataContextError:
-        suite = ExpectationSuite(expectation_suite_name=expectation_suite_name)
-        logger.info(f"Created empty ExpectationSuite '{suite.expectation_suite_name}'.")
-
-    batch = ge.from_pandas(df)
-    batch.expectation_suite_name = expectation_suite_name
-
-    features_0_1 = [
-        'Borrowing dependency',
-        'ROA(C) before interest and depreciation before interest',
-        'Continuous Net Profit Growth Rate',
-        'Current Liabilities/Liability',
-        'Interest Expense Ratio',
-        'Operating Profit Growth Rate',
-        'Long-term fund suitability ratio (A)',
-        'Cash Flow Per Share'
-    ]
-    features_0_1e10 = [
-        'Quick Ratio',
-        'Fixed Assets to Assets',
-        'Interest-bearing debt interest rate',
-        'Total debt/Total net worth',
-        'Research and development expense rate',
-        'Allocation rate per person',
-        'Revenue per person',
-        'Accounts Receivable Turnover',
-        'Quick Assets/Total Assets',
-        'Total income/Total expense',
-        'Net Value Per Share (B)',
-        'Cash Flow to Equity',
-        'Non-industry income and expenditure/revenue',
-        'After-tax Net Profit Growth Rate',
-        'Inventory Turnover Rate (times)',
-        'Total expense/Assets',
-        'Net Value Growth Rate',
-        'Operating Expense Rate',
-        'Total Asset Growth Rate',
-        'Cash Turnover Rate',
-        'Average Collection Days'
-    ]
-
-    for feature in final_features:
-        batch.expect_column_to_exist(column=feature)
-        batch.expect_column_values_to_not_be_null(column=feature)
-        batch.expect_column_values_to_be_of_type(column=feature, type_="float")
-
-        if feature in features_0_1:
-            batch.expect_column_values_to_be_between(column=feature, min_value=0, max_value=1)
-        elif feature in features_0_1e10:
-            batch.expect_column_values_to_be_between(column=feature, min_value=0, max_value=1e10)
-        else:
-            logger.warning(f"Feature {feature} not assigned to a validation group.")
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.REQUEST_SECONDS.labels(route).observe(end - start)
+    metrics.REQUEST_BYTES.labels(route).inc(int(request.headers.get("content-length", 0)))
+    if "content-length" in response.headers:
+        metrics.RESPONSE_BYTES.labels(route).inc(int(response.headers["content-length"]))
+    response.headers["Server-Timing"] = metrics.server_timing(timings, end - start)
+    if profiler is not None:
+        await run_in_threadpool(profiler.check, start, end, route)
+    return response
 
-    results = batch.validate(result_format="SUMMARY")
-    return results["success"]
+# helper functions
+async def preprocess_input(file: UploadFile) -> pd.DataFrame:
+    # parse straight from the spooled upload, without copying it into memory
+    return await run_in_threadpool(read_upload, file.file, file.content_type, file.filename)
 
-def validate_output(predictions: List[int], probabilities: List[float]) -> bool:
-    context = ge.get_context()
-    expectation_suite_name = "output_suite"
+@asynccontextmanager
+async def admission():
+    # backpressure: fail fast when the worker pool queue is full
+    try:
+        async with pool.admit():
+            yield
+    except PoolSaturated:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry.", headers={"Retry-After": "1"})
 
+def resolve_version(model_version: Optional[str]) -> str:
+    # pinned requests must name a version on disk, others use the active one
     try:
-        suite = context.get_expectation_suite(expectation_suite_name=expectation_suite_name)
-        logger.info(f"Loaded ExpectationSuite '{suite.name}' containing {len(suite.expectations)} expectations.")
-    except ge.exceptions.DataContextError:
-        suite = ExpectationSuite(expectation_suite_name=expectation_suite_name)
-        logger.info(f"Created empty ExpectationSuite '{suite.expectation_suite_name}'.")
-
-    df = pd.DataFrame({
-        'predictions': predictions,
-        'probabilities': probabilities
-    })
-    
-    batch = ge.from_pandas(df)
-    batch.expectation_suite_name = expectation_suite_name
-    batch.expect_column_to_exist(column="predictions")
-    batch.expect_column_values_to_be_in_set(column="predictions", value_set=[0, 1])
-    batch.expect_column_to_exist(column="probabilities")
-    batch.expect_column_values_to_be_between(column="probabilities", min_value=0, max_value=1)
-
-    results = batch.validate(result_format="SUMMARY")
-    return results["success"]
-
-def get_predictions_with_explanations(df: pd.DataFrame):
+        return registry.resolve(model_version)
+    except UnknownModelVersion:
+        raise HTTPException(status_code=404, detail=f"Unknown model version {model_version}.")
+
+def check_result(result: ScoreResult, offset: int = 0):
+    # input values validation
+    input_report = result.input_report
+    if not input_report.success:
+        for failure in input_report.failures:
+            if failure["row"] is not None:
+                failure["row"] += offset
+        raise HTTPException(status_code=400, detail={
+            "message": "Input data validation failed.",
+            "failed_rows": input_report.failed_rows,
+            "failures": input_report.failures
+        })
+
+    # output values validation
+    output_report = result.output_report
+    if not output_report.success:
+        logger.error(f"Output data validation failed: {output_report.failures}")
+        raise HTTPException(status_code=500, detail="Output data validation failed.")
+
+    return result.predictions, result.probabilities, result.shap_values
+
+async def score_batch(df: pd.DataFrame, explain: ExplainMode = "full", version: Optional[str] = None,
+                      method: ExplainMethod = "exact"):
+    # validation, model prediction with explanations and output validation on the worker pool
     try:
-        predictions = model.predict(df)
-        probabilities = model.predict_proba(df)[:, 1] 
-        
-        shap_values = explainer(df)
-        
-        shap_values_list = []
-        for i in range(len(df)):
-            sample_dict = {}
-            for j, feature in enumerate(final_features):
-                sample_dict[feature] = float(shap_values.values[i, j])
-            shap_values_list.append(sample_dict)
-            
-        return predictions.tolist(), probabilities.tolist(), shap_values_list
+        if BATCHING_ENABLED:
+            # coalesced with concurrent requests on the same version and method
+            result = await batcher.submit(df, explain != "none", version, method)
+        else:
+            result = (await pool.score([df], [explain != "none"], version, method))[0]
     except Exception as e:
         logger.exception(f"Internal error during prediction: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal error during prediction.")
+    add_request_timings(result.timings)
+    return check_result(result)
 
-# helper functions
-async def preprocess_input(file: UploadFile) -> pd.DataFrame:
+def score_chunk(df: pd.DataFrame, offset: int, explain: ExplainMode, version: str, method: ExplainMethod):
+    # called from the streaming generator, which already runs on a thread
     try:
-        file_content = await file.read()
-        file_io = io.StringIO(file_content.decode("utf-8"))
-        df = pd.read_csv(file_io)
-    except pd.errors.EmptyDataError:
-        raise HTTPException(status_code=400, detail="The uploaded file is empty.")
-    except pd.errors.ParserError:
-        raise HTTPException(status_code=400, detail="Invalid CSV format. Please upload a valid CSV file.")
+        result = pool.score_sync([df], [explain != "none"], version, method)[0]
     except Exception as e:
-        logger.exception("Error reading CSV file.")
-        raise HTTPException(status_code=500, detail="Internal server error while reading the file.")
+        logger.exception(f"Internal error during prediction: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal error during prediction.")
+    return check_result(result, offset)
+
+def observe_drift(version: str, df: pd.DataFrame, probabilities):
+    # rows that passed validation, counted into the version's drift histograms
+    if drift.enabled:
+        drift.observe(version, df[final_features].to_numpy(dtype=float), probabilities)
+
+def max_psi(version: str) -> float:
+    monitor = drift.monitor(version)
+    value = monitor.report()["max_psi"] if monitor is not None else None
+    return value if value is not None else float("nan")
+
+def process_memory(field: str) -> Dict[str, int]:
+    return {p["process"]: p[field] for p in pool.memory() if field in p}
+
+def store_summary(version: str, df: pd.DataFrame, predictions, probabilities, top_n: int) -> dict:
+    result_id, stored = results_store.put(version, df[final_features].to_numpy(dtype=np.float32), predictions,
+                                          probabilities)
+    return {"model_version": version, "result_id": result_id, "expires_at": stored.expires_at,
+            **summarize(predictions, probabilities, top_n)}
+
+def to_json(predictions, probabilities, shap_values, explain: ExplainMode, top_k: int, version: str,
+            **fields) -> bytes:
+    return dumps({
+        **fields,
+        "model_version": version,
+        "predictions": predictions,
+        "probabilities": probabilities,
+        **serialize_shap(shap_values, explain, top_k)
+    })
 
-    df_final = df[final_features]
+def encoded_response(body: bytes, media_type: str, headers: Dict[str, str], accept_encoding: Optional[str]) -> Response:
+    # large results skip response_model validation: the body is written from
+    # the result arrays and compressed when the client accepts it
+    body, encoding = compress(body, media_type, accept_encoding)
+    headers = {**headers, "Vary": "Accept, Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
+
+def spool_upload(source: IO) -> IO:
+    # FastAPI closes the upload when the endpoint returns, before a streamed
+    # response has read it, so the stream reads its own copy
+    f = tempfile.TemporaryFile()
+    shutil.copyfileobj(source, f, 1 << 20)
+    f.seek(0)
+    return f
+
+def stream_results(chunks: Iterator[pd.DataFrame], source: IO, format: str, explain: ExplainMode, top_k: int,
+                   version: str, method: ExplainMethod) -> Iterator[bytes]:
+    offset = 0
     try:
-        df_final = df_final.astype(float)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="All input values must be floats.")
-    return df_final
+        if format == "json":
+            yield b"["
+        try:
+            for df in chunks:
+                results = score_chunk(df, offset, explain, version, method)
+                observe_drift(version, df, results[1])
+                line = to_json(*results, explain, top_k, version, offset=offset)
+                if format == "ndjson":
+                    yield line + b"\n"
+                else:
+                    yield (b"," if offset else b"") + line
+                offset += len(df)
+        except HTTPException as e:
+            # the status code is already sent, so errors are reported in-band
+            error = dumps({"offset": offset, "error": e.detail})
+            if format == "ndjson":
+                yield error + b"\n"
+            else:
+                yield (b"," if offset else b"") + error
+        if format == "json":
+            yield b"]"
+        REQUEST_ROWS.labels("/predict/stream").observe(offset)
+    finally:
+        # also runs when the client disconnects mid-stream
+        source.close()
+        pool.release()
 
 # endpoints
-@app.post("/predict", response_model=PredictReturnModel)
-async def predict(file: UploadFile = File(...)):
-    # file and datatype validation
-    df_final = await preprocess_input(file)
-    
-    # ge input values validation
-    if not validate_input(df_final):
-        raise HTTPException(status_code=400, detail="Input data validation failed.")
-
-    # model prediction with explanations
-    predictions_list, probabilities_list, shap_values_list = get_predictions_with_explanations(df_final)
-
-    # ge output values validation
-    if not validate_output(predictions_list, probabilities_list):
-        raise HTTPException(status_code=500, detail="Output data validation failed.")
-    
+@app.post(
+    "/predict",
+    response_model=Union[PredictReturnModel, PredictSummary],
+    response_model_exclude_none=True,
+    responses={200: {"content": {ARROW_STREAM: {}, PARQUET: {}, NPZ: {}}, "headers": ENCODED_RESPONSE_HEADERS}},
+)
+async def predict(
+    response: Response,
+    file: UploadFile = File(...),
+    explain: ExplainMode = "full",
+    explain_method: ExplainMethod = EXPLAIN_METHOD,
+    top_k: int = Query(5, ge=1, le=len(final_features)),
+    model_version: Optional[str] = None,
+    output: Literal["rows", "summary"] = "rows",
+    top_n: int = Query(10, ge=0, le=1000),
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    # resolved once, so a model swap mid-request does not mix versions
+    version = resolve_version(model_version)
+    async with admission():
+        # file and datatype validation (csv, arrow, parquet or npy upload)
+        with timed("parse"):
+            df_final = await preprocess_input(file)
+        REQUEST_ROWS.labels("/predict").observe(len(df_final))
+
+        # a summary carries no SHAP; rows are explained one at a time later
+        results = await score_batch(df_final, explain if output == "rows" else "none", version, explain_method)
+        with timed("drift"):
+            await run_in_threadpool(observe_drift, version, df_final, results[1])
+
+        headers = {"X-Model-Version": version}
+        response.headers.update(headers)
+        if output == "summary":
+            with timed("serialize"):
+                return await run_in_threadpool(store_summary, version, df_final, *results[:2], top_n)
+
+        # columnar results for clients that ask for them
+        media_type = negotiate(accept)
+        with timed("serialize"):
+            if media_type != JSON:
+                body = await run_in_threadpool(encode, media_type, *results, explain, top_k)
+            else:
+                body = await run_in_threadpool(to_json, *results, explain, top_k, version)
+        with timed("compress"):
+            return await run_in_threadpool(encoded_response, body, media_type, headers, accept_encoding)
+
+@app.post("/predict/stream")
+async def predict_stream(
+    file: UploadFile = File(...),
+    format: Literal["ndjson", "json"] = "ndjson",
+    chunk_rows: int = Query(STREAM_CHUNK_ROWS, gt=0),
+    explain: ExplainMode = "full",
+    explain_method: ExplainMethod = EXPLAIN_METHOD,
+    top_k: int = Query(5, ge=1, le=len(final_features)),
+    model_version: Optional[str] = None,
+):
+    version = resolve_version(model_version)
+    # the admission slot is held until the stream is finished
+    try:
+        pool.acquire()
+    except PoolSaturated:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry.", headers={"Retry-After": "1"})
+
+    # header and format errors are raised here, before streaming starts
+    source = None
+    try:
+        source = await run_in_threadpool(spool_upload, file.file)
+        chunks = await run_in_threadpool(iter_csv_chunks, source, chunk_rows)
+    except Exception:
+        if source is not None:
+            source.close()
+        pool.release()
+        raise
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(stream_results(chunks, source, format, explain, top_k, version, explain_method),
+                             media_type=media_type,
+                             headers={"X-Model-Version": version})
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    explain: ExplainMode = "full",
+    explain_method: ExplainMethod = EXPLAIN_METHOD,
+    chunk_rows: int = Query(JOB_CHUNK_ROWS, gt=0),
+    model_version: Optional[str] = None,
+):
+    # the upload is stored and scored in the background; poll GET /jobs/{id}
+    version = resolve_version(model_version)
+    try:
+        return await run_in_threadpool(jobs.submit, file.file, file.content_type, file.filename, explain,
+                                       explain_method, version, chunk_rows)
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Too many queued jobs, please retry.", headers={"Retry-After": "10"})
+
+def get_job(job_id: str) -> JobStatus:
+    job = jobs.store.load(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def job_status(job_id: str):
+    return get_job(job_id)
+
+@app.get(
+    "/jobs/{job_id}/results",
+    response_model=JobResultsPage,
+    response_model_exclude_none=True,
+    responses={200: {"content": {ARROW_STREAM: {}, PARQUET: {}, NPZ: {}}, "headers": ENCODED_RESPONSE_HEADERS}},
+)
+async def job_results(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=100000),
+    explain: Optional[ExplainMode] = None,
+    top_k: int = Query(5, ge=1, le=len(final_features)),
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    # a page of the rows completed so far; explain defaults to the job's mode
+    job = get_job(job_id)
+    explain = explain or job.explain
+    results = await run_in_threadpool(jobs.store.read_rows, job, offset, limit)
+    end = offset + len(results[0])
+    more = end < job.rows_done or job.status in ("queued", "running")
+    next_offset = end if more else None
+
+    media_type = negotiate(accept)
+    headers = {"X-Model-Version": job.model_version}
+    if media_type != JSON:
+        if next_offset is not None:
+            headers["X-Next-Offset"] = str(next_offset)
+        body = await run_in_threadpool(encode, media_type, *results, explain, top_k)
+    else:
+        page = {"offset": offset} if next_offset is None else {"offset": offset, "next_offset": next_offset}
+        body = await run_in_threadpool(to_json, *results, explain, top_k, job.model_version, **page)
+    return await run_in_threadpool(encoded_response, body, media_type, headers, accept_encoding)
+
+@app.delete("/jobs/{job_id}", status_code=204)
+async def delete_job(job_id: str):
+    job = get_job(job_id)
+    if job.status == "running":
+        raise HTTPException(status_code=409, detail="Job is running.")
+    await run_in_threadpool(jobs.store.delete, job_id)
+
+@app.get("/models")
+async def models():
+    return registry.describe()
+
+@app.post("/models/reload", status_code=202)
+async def reload_models():
+    # rescans the model directory; a new latest version is loaded and warmed
+    # in the background and swapped in once ready, unless a version is pinned
+    await run_in_threadpool(registry.refresh, pool.warm)
+    return registry.describe()
+
+@app.post("/models/{version}/activate", status_code=202)
+async def activate_model(version: str):
+    # the current version keeps serving until the new one is warm
+    try:
+        registry.activate(version, pool.warm)
+    except UnknownModelVersion:
+        raise HTTPException(status_code=404, detail=f"Unknown model version {version}.")
+    return registry.describe()
+
+def get_result(result_id: str):
+    result = results_store.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired.")
+    return result
+
+@app.get(
+    "/results/{result_id}/rows",
+    response_model=ResultRowsPage,
+    response_model_exclude_none=True,
+    responses={200: {"headers": ENCODED_RESPONSE_HEADERS}},
+)
+async def result_rows(
+    result_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=100000),
+    band: Optional[RiskBandName] = None,
+    order: Literal["row", "risk", "probability"] = "row",
+    min_probability: Optional[float] = Query(None, ge=0, le=1),
+    max_probability: Optional[float] = Query(None, ge=0, le=1),
+    accept_encoding: Optional[str] = Header(None),
+):
+    # row ids, predictions and probabilities of a summary-mode result, without SHAP
+    result = get_result(result_id)
+    rows = await run_in_threadpool(select_rows, result.probabilities, band, order, min_probability, max_probability)
+    page = rows[offset:offset + limit]
+    end = offset + len(page)
+    content = {
+        "model_version": result.model_version,
+        "total": len(rows),
+        "offset": offset,
+        "rows": page,
+        "predictions": result.predictions[page],
+        "probabilities": result.probabilities[page],
+    }
+    if end < len(rows):
+        content["next_offset"] = end
+    body = await run_in_threadpool(dumps, content)
+    return await run_in_threadpool(encoded_response, body, JSON, {"X-Model-Version": result.model_version},
+                                   accept_encoding)
+
+@app.get("/results/{result_id}/rows/{row}/explanation", response_model=RowExplanation)
+async def result_row_explanation(result_id: str, row: int, explain_method: ExplainMethod = EXPLAIN_METHOD):
+    # SHAP of one row, computed on demand from the stored feature values
+    result = get_result(result_id)
+    if not 0 <= row < len(result.probabilities):
+        raise HTTPException(status_code=404, detail="Row not found.")
+    async with admission():
+        try:
+            shap_values = await pool.run(explain_rows, result.X[row:row + 1], result.model_version, explain_method)
+        except UnknownModelVersion:
+            raise HTTPException(status_code=410, detail=f"Model version {result.model_version} was removed.")
     return {
-        "predictions": predictions_list, 
-        "probabilities": probabilities_list,
-        "shap_values": shap_values_list
+        "model_version": result.model_version,
+        "row": row,
+        "prediction": int(result.predictions[row]),
+        "probability": float(result.probabilities[row]),
+        "shap_values": dict(zip(final_features, shap_values[0].tolist())),
     }
+
+@app.delete("/results/{result_id}", status_code=204)
+async def delete_result(result_id: str):
+    results_store.delete(result_id)
+
+@app.post(
+    "/sensitivity",
+    response_model=SensitivityCurves,
+    responses={200: {"headers": ENCODED_RESPONSE_HEADERS}},
+)
+async def sensitivity(
+    request: SensitivityRequest,
+    model_version: Optional[str] = None,
+    accept_encoding: Optional[str] = Header(None),
+):
+    # bankruptcy probability of one row as one or two of its features vary
+    # over a grid; all scenarios are scored in one model call, without SHAP
+    if request.result_id is not None:
+        # a stored row was validated when it was scored, and keeps its version
+        result = get_result(request.result_id)
+        if request.result_row is None or not 0 <= request.result_row < len(result.probabilities):
+            raise HTTPException(status_code=404, detail="Row not found.")
+        base, version = result.X[request.result_row], result.model_version
+    elif request.row is not None:
+        base, version = base_row(request.row), resolve_version(model_version)
+    else:
+        raise HTTPException(status_code=400, detail="Give the base row as row, or as result_id and result_row.")
+    values = grid(request.axes)
+    features = [axis.feature for axis in request.axes]
+    shape = [len(v) for v in values]
+    REQUEST_ROWS.labels("/sensitivity").observe(int(np.prod(shape)))
+
+    async with admission():
+        try:
+            result = await pool.run(score_scenarios, base, features, values, version)
+        except UnknownModelVersion:
+            raise HTTPException(status_code=410, detail=f"Model version {version} was removed.")
+    add_request_timings(result.timings)
+    predictions, probabilities, _ = check_result(result)
+    content = {
+        "model_version": version,
+        "base_probability": float(probabilities[0]),
+        "base_prediction": int(predictions[0]),
+        "features": features,
+        "values": values,
+        "probabilities": probabilities[1:].reshape(shape),
+        "predictions": predictions[1:].reshape(shape),
+    }
+    with timed("serialize"):
+        body = dumps(content)
+    return encoded_response(body, JSON, {"X-Model-Version": version}, accept_encoding)
+
+@app.get("/importance", response_model=GlobalImportance, response_model_exclude_none=True)
+async def global_importance(model_version: Optional[str] = None):
+    # mean |SHAP| per feature, precomputed with the model (importance.py)
+    version = resolve_version(model_version)
+    importance = await run_in_threadpool(load_importance, importance_path_for(registry.path(version)))
+    if importance is None:
+        raise HTTPException(status_code=404, detail=f"No global importances for model version {version}.")
+    return {"model_version": version, **importance}
+
+@app.get("/drift")
+async def drift_report(model_version: Optional[str] = None):
+    # PSI of the rows scored since start-up or the last reset against the
+    # training reference, per feature and for the predicted probability
+    if not drift.enabled:
+        raise HTTPException(status_code=404, detail="Drift monitoring is disabled, set DRIFT_ENABLED=1.")
+    version = resolve_version(model_version)
+    monitor = drift.monitor(version)
+    if monitor is None:
+        raise HTTPException(status_code=404, detail=f"No drift reference for model version {version}.")
+    return {"model_version": version, **await run_in_threadpool(monitor.report)}
+
+@app.post("/drift/reset", status_code=204)
+async def reset_drift(model_version: Optional[str] = None):
+    monitor = drift.monitor(resolve_version(model_version))
+    if monitor is not None:
+        monitor.reset()
+
+@app.get("/health")
+async def health():
+    # answered on the event loop, never queued behind inference
+    return {"status": "ok", "model_version": registry.active, **pool.stats(), "jobs_queued": jobs.queued()}
+
+@app.get("/memory")
+async def memory():
+    # per-process memory; with WORKER_POOL=fork the model's pages are shared,
+    # so the workers' pss stays well below their rss
+    processes = await run_in_threadpool(pool.memory)
+    return {
+        "kind": pool.kind,
+        "processes": processes,
+        "total_pss": sum(p.get("pss", 0) for p in processes),
+        "total_rss": sum(p.get("rss", 0) for p in processes),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/batching/stats")
+async def batching_stats():
+    return batcher.stats()
+
+@app.get("/cache/stats")
+async def prediction_cache_stats():
+    stats = await pool.cache_stats()
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Prediction cache is disabled.")
+    return stats
@@ -0,0 +1,177 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# upper bounds in seconds, shared by the latency histograms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ROW_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+class Histogram:
+    # fixed-bucket histogram, safe to observe from worker threads
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> Dict:
+        # cumulative counts per upper bound, as in the Prometheus exposition format
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative, running = {}, 0
+        for bound, n in zip(self.buckets, counts):
+            running += n
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = count
+        return {"buckets": cumulative, "count": count, "sum": total}
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+class Family:
+    # one child metric per value of a single label, created on first use
+    def __init__(self, label: str, factory: Callable[[], object]):
+        self.label = label
+        self.factory = factory
+        self.children: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value: str):
+        child = self.children.get(value)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(value, self.factory())
+        return child
+
+class GaugeFamily:
+    # gauges read at scrape time, one per label value in the dict read() returns
+    def __init__(self, label: str, read: Callable[[], Dict[str, float]]):
+        self.label = label
+        self.read = read
+
+# prometheus registry: (name, help, metric); gauges are callables read at scrape time.
+# counter names carry their _total suffix, so TYPE and samples use the same name
+_registry: List[Tuple[str, str, object]] = []
+
+def register(name: str, help: str, metric):
+    _registry.append((name, help, metric))
+    return metric
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+def _render_metric(name: str, metric, labels: Dict[str, str], lines: List[str]):
+    if isinstance(metric, Histogram):
+        snapshot = metric.snapshot()
+        for bound, count in snapshot["buckets"].items():
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {snapshot['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+    elif isinstance(metric, Counter):
+        lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+    else:
+        lines.append(f"{name}{_format_labels(labels)} {metric()}")
+
+def _metric_type(metric) -> str:
+    if isinstance(metric, Family):
+        metric = metric.factory()
+    if isinstance(metric, Histogram):
+        return "histogram"
+    return "counter" if isinstance(metric, Counter) else "gauge"
+
+def render() -> str:
+    # prometheus text exposition format, version 0.0.4
+    lines: List[str] = []
+    for name, help, metric in _registry:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {_metric_type(metric)}")
+        if isinstance(metric, Family):
+            for value, child in sorted(metric.children.items()):
+                _render_metric(name, child, {metric.label: value}, lines)
+        elif isinstance(metric, GaugeFamily):
+            for value, reading in sorted(metric.read().items()):
+                lines.append(f"{name}{_format_labels({metric.label: value})} {reading}")
+        else:
+            _render_metric(name, metric, {}, lines)
+    return "\n".join(lines) + "\n"
+
+# per-stage latency: stages of a model call run on the worker pool and come
+# back as a dict; stages of the request itself are timed in the API process
+STAGE_SECONDS = register("bankruptcy_stage_seconds", "Latency of each pipeline stage.",
+                         Family("stage", lambda: Histogram(LATENCY_BUCKETS)))
+REQUEST_SECONDS = register("bankruptcy_request_seconds", "Request latency up to the response headers, by route.",
+                           Family("route", lambda: Histogram(LATENCY_BUCKETS)))
+REQUEST_ROWS = register("bankruptcy_request_rows", "Rows per scoring request, by route.",
+                        Family("route", lambda: Histogram(ROW_BUCKETS)))
+REQUEST_BYTES = register("bankruptcy_request_bytes_total", "Request body bytes received, by route.",
+                         Family("route", Counter))
+RESPONSE_BYTES = register("bankruptcy_response_bytes_total", "Response body bytes sent with a known length, by route.",
+                          Family("route", Counter))
+
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+@contextmanager
+def stage(timings: Optional[Dict[str, float]], name: str):
+    # adds the block's duration to timings[name], if timings are collected
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+def observe_stages(timings: Optional[Dict[str, float]]):
+    for name, seconds in (timings or {}).items():
+        STAGE_SECONDS.labels(name).observe(seconds)
+
+def start_request() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+def add_request_timings(timings: Optional[Dict[str, float]]):
+    # stages of a (possibly batched) model call, shown in the Server-Timing header
+    current = _request_timings.get()
+    if current is not None:
+        for name, seconds in (timings or {}).items():
+            current[name] = current.get(name, 0.0) + seconds
+
+@contextmanager
+def timed(name: str):
+    # a request-level stage: observed in the stage histogram and reported
+    # in the Server-Timing header of the current request
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(seconds)
+        add_request_timings({name: seconds})
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    # "other" is routing, response model validation and rendering
+    entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items()]
+    other = max(total - sum(timings.values()), 0.0)
+    entries.append(f"other;dur={other * 1000:.3f}")
+    entries.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(entries)
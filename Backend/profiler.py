@@ -0,0 +1,70 @@
+import collections
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from typing import Deque, Dict, Tuple
+
+from config import PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILE_DIR
+
+logger = logging.getLogger("uvicorn.error")
+
+# threads whose innermost frame is in one of these modules are idle, waiting
+# on a lock, queue or socket, and are left out of the samples
+_IDLE_MODULES = ("threading.py", "queue.py", "selectors.py")
+
+# opt-in sampling profiler: a background thread samples the stacks of all
+# threads of this process into a ring buffer; a request slower than
+# PROFILE_SLOW_MS gets the samples taken while it ran written out in the
+# collapsed-stack format read by flamegraph.pl and speedscope. Samples of
+# concurrent requests are included, and process pool workers are not sampled.
+class SamplingProfiler:
+    def __init__(self, slow_ms: float = PROFILE_SLOW_MS, interval_ms: float = PROFILE_INTERVAL_MS,
+                 out_dir: str = PROFILE_DIR, window_s: float = 60):
+        self.slow = slow_ms / 1000
+        self.interval = interval_ms / 1000
+        self.out_dir = out_dir
+        self._samples: Deque[Tuple[float, str]] = collections.deque(maxlen=int(window_s / self.interval))
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own or os.path.basename(frame.f_code.co_filename) in _IDLE_MODULES:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                stacks.append(";".join(reversed(frames)))
+            with self._lock:
+                self._samples.extend((now, stack) for stack in stacks)
+            time.sleep(self.interval)
+
+    def check(self, start: float, end: float, route: str):
+        # writes the samples of [start, end] if the request was slow; returns the file name
+        if end - start < self.slow:
+            return None
+        with self._lock:
+            samples = [stack for t, stack in self._samples if start <= t <= end]
+        folded: Dict[str, int] = collections.Counter(samples)
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int((end - start) * 1000)}ms-{re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_')}.folded"
+        with open(os.path.join(self.out_dir, name), "w") as f:
+            for stack, count in folded.items():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Slow request to {route} ({(end - start) * 1000:.0f} ms), profile written to {name}.")
+        return name
+
+def create_profiler():
+    return SamplingProfiler() if PROFILE_SLOW_MS > 0 else None
@@ -0,0 +1,106 @@
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+import artifact
+from config import MODEL_DIR, MODEL_PATH, MODEL_VERSION
+
+logger = logging.getLogger("uvicorn.error")
+
+class UnknownModelVersion(Exception):
+    pass
+
+def model_versions(model_dir: str = MODEL_DIR) -> Dict[str, str]:
+    # version name -> model file, in sort order; without versioned models the
+    # single MODEL_PATH is served under a prefix of its hash
+    versions = {}
+    if os.path.isdir(model_dir):
+        for name in sorted(os.listdir(model_dir)):
+            path = os.path.join(model_dir, name, "model.json")
+            if os.path.isfile(path):
+                versions[name] = path
+    if not versions and os.path.isfile(MODEL_PATH):
+        versions[artifact.model_hash(MODEL_PATH)[:12]] = MODEL_PATH
+    return versions
+
+def model_path(version: str) -> str:
+    versions = model_versions()
+    if version not in versions:
+        raise UnknownModelVersion(version)
+    return versions[version]
+
+def default_version(model_dir: str = MODEL_DIR) -> str:
+    # the pinned version, otherwise the last one in sort order
+    versions = model_versions(model_dir)
+    if not versions:
+        raise RuntimeError(f"No model found in {model_dir} or at {MODEL_PATH}.")
+    version = MODEL_VERSION or list(versions)[-1]
+    if version not in versions:
+        raise RuntimeError(f"Model version {version} not found in {model_dir}.")
+    return version
+
+class ModelRegistry:
+    # tracks the versions on disk and the active one. Activating a version
+    # loads and warms it in a background thread first, then switches the
+    # active name; requests resolve their version once when they start, so
+    # in-flight requests finish on the engine they started with
+    def __init__(self, model_dir: str = MODEL_DIR):
+        self.model_dir = model_dir
+        self.pinned = MODEL_VERSION
+        self.versions = model_versions(model_dir)
+        self.active = default_version(model_dir)
+        # available, loading, ready or failed
+        self.status: Dict[str, str] = {self.active: "ready"}
+        self._lock = threading.Lock()
+
+    def resolve(self, version: Optional[str] = None) -> str:
+        # the version a request runs on: the one it pins, or the active one
+        if version is None:
+            return self.active
+        if version not in self.versions:
+            raise UnknownModelVersion(version)
+        return version
+
+    def path(self, version: str) -> str:
+        # the model file of a version as of the last scan, without rescanning
+        # the directory or hashing an unversioned model again
+        versions = self.versions
+        if version not in versions:
+            raise UnknownModelVersion(version)
+        return versions[version]
+
+    def activate(self, version: str, warm: Callable[[str], None]):
+        self.resolve(version)
+        with self._lock:
+            if self.status.get(version) == "loading":
+                return
+            self.status[version] = "loading"
+        threading.Thread(target=self._activate, args=(version, warm), name=f"activate-{version}", daemon=True).start()
+
+    def _activate(self, version: str, warm: Callable[[str], None]):
+        try:
+            warm(version)
+        except Exception as e:
+            logger.exception(f"Loading model version {version} failed: {str(e)}")
+            self.status[version] = "failed"
+            return
+        self.status[version] = "ready"
+        # a single assignment, so readers see either the old or the new version
+        self.active = version
+        logger.info(f"Model version {version} is active.")
+
+    def refresh(self, warm: Callable[[str], None]):
+        # rescans the model directory; unless a version is pinned, a new
+        # latest version is loaded and activated in the background
+        self.versions = model_versions(self.model_dir)
+        latest = list(self.versions)[-1] if self.versions else None
+        if self.pinned is None and latest is not None and latest != self.active:
+            self.activate(latest, warm)
+
+    def describe(self) -> Dict:
+        versions: List[Dict] = [
+            {"version": version, "status": self.status.get(version, "available")}
+            for version in self.versions
+        ]
+        return {"active": self.active, "pinned": self.pinned is not None, "versions": versions}
@@ -0,0 +1,163 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Literal, NamedTuple, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from config import RESULT_STORE_MAX_MB, RESULT_STORE_TTL_S
+
+# risk bands on the bankruptcy probability, as shown by the frontend: a band
+# holds probabilities from its lower bound up to, not including, the next one
+RISK_BANDS = ["Very Low Risk", "Low Risk", "Moderate Risk", "High Risk", "Very High Risk"]
+RISK_BAND_EDGES = np.array([0.2, 0.4, 0.6, 0.8])
+RiskBandName = Literal["Very Low Risk", "Low Risk", "Moderate Risk", "High Risk", "Very High Risk"]
+
+# schemas / data contracts
+class RiskBand(BaseModel):
+    band: str
+    lower: float
+    upper: float
+    count: int
+
+class RankedRow(BaseModel):
+    row: int
+    prediction: int
+    probability: float
+
+class ConfidenceStats(BaseModel):
+    # confidence of a prediction is max(p, 1 - p)
+    mean: float
+    min: float
+    max: float
+    mean_probability: float
+
+class PredictSummary(BaseModel):
+    model_version: str
+    result_id: str
+    expires_at: float
+    rows: int
+    bankrupt: int
+    healthy: int
+    risk_bands: List[RiskBand]
+    confidence: ConfidenceStats
+    # riskiest rows, highest probability first
+    top: List[RankedRow]
+
+class ResultRowsPage(BaseModel):
+    model_version: str
+    # rows matching the filter, of which this page holds rows[offset:offset + limit]
+    total: int
+    offset: int
+    next_offset: Optional[int] = None
+    rows: List[int]
+    predictions: List[int]
+    probabilities: List[float]
+
+class RowExplanation(BaseModel):
+    model_version: str
+    row: int
+    prediction: int
+    probability: float
+    shap_values: Dict[str, float]
+
+class StoredResult(NamedTuple):
+    model_version: str
+    X: np.ndarray
+    predictions: np.ndarray
+    probabilities: np.ndarray
+    expires_at: float
+
+def risk_bands(probabilities: np.ndarray) -> np.ndarray:
+    # band index per row
+    return np.digitize(probabilities, RISK_BAND_EDGES)
+
+def summarize(predictions: np.ndarray, probabilities: np.ndarray, top_n: int) -> Dict:
+    bands = np.bincount(risk_bands(probabilities), minlength=len(RISK_BANDS))
+    bounds = np.concatenate([[0.0], RISK_BAND_EDGES, [1.0]])
+    confidence = np.maximum(probabilities, 1 - probabilities)
+    top_n = min(top_n, len(probabilities))
+    top = np.argpartition(-probabilities, top_n - 1)[:top_n] if top_n else np.zeros(0, dtype=np.int64)
+    top = top[np.argsort(-probabilities[top], kind="stable")]
+    bankrupt = int(predictions.sum())
+    return {
+        "rows": len(predictions),
+        "bankrupt": bankrupt,
+        "healthy": len(predictions) - bankrupt,
+        "risk_bands": [{"band": band, "lower": float(bounds[i]), "upper": float(bounds[i + 1]), "count": int(bands[i])}
+                       for i, band in enumerate(RISK_BANDS)],
+        # all zero for a file without rows
+        "confidence": {"mean": float(confidence.mean()), "min": float(confidence.min()),
+                       "max": float(confidence.max()), "mean_probability": float(probabilities.mean())}
+                      if len(probabilities) else {"mean": 0.0, "min": 0.0, "max": 0.0, "mean_probability": 0.0},
+        "top": [{"row": int(i), "prediction": int(predictions[i]), "probability": float(probabilities[i])} for i in top],
+    }
+
+def select_rows(probabilities: np.ndarray, band: Optional[str], order: str,
+                min_probability: Optional[float] = None, max_probability: Optional[float] = None) -> np.ndarray:
+    # row ids in one risk band (or all) and probability range, by row id, by
+    # decreasing (risk) or by increasing (probability) probability
+    mask = np.ones(len(probabilities), dtype=bool) if band is None else (
+        risk_bands(probabilities) == RISK_BANDS.index(band))
+    if min_probability is not None:
+        mask &= probabilities >= min_probability
+    if max_probability is not None:
+        mask &= probabilities <= max_probability
+    rows = np.flatnonzero(mask)
+    if order == "risk":
+        rows = rows[np.argsort(-probabilities[rows], kind="stable")]
+    elif order == "probability":
+        rows = rows[np.argsort(probabilities[rows], kind="stable")]
+    return rows
+
+class ResultStore:
+    # feature rows, predictions and probabilities of recent requests by result
+    # id, so one row's explanation is computed when it is asked for instead of
+    # sending SHAP for every row; bounded by size and age, oldest dropped first
+    def __init__(self, max_bytes: int = int(RESULT_STORE_MAX_MB * 2 ** 20), ttl: float = RESULT_STORE_TTL_S):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._results: "OrderedDict[str, StoredResult]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, model_version: str, X: np.ndarray, predictions: np.ndarray,
+            probabilities: np.ndarray) -> Tuple[str, StoredResult]:
+        result_id = uuid.uuid4().hex
+        # copies: the arrays passed in may be views of a larger batch, which
+        # would stay alive uncounted by the size limit
+        result = StoredResult(model_version, np.array(X, dtype=np.float32, order="C"), np.array(predictions),
+                              np.array(probabilities), time.time() + self.ttl)
+        with self._lock:
+            self._results[result_id] = result
+            self._bytes += self._size(result)
+            now = time.time()
+            # the new result is kept even when it alone exceeds the limit
+            while len(self._results) > 1:
+                oldest_id, oldest = next(iter(self._results.items()))
+                if self._bytes <= self.max_bytes and oldest.expires_at > now:
+                    break
+                self._remove(oldest_id)
+        return result_id, result
+
+    def get(self, result_id: str) -> Optional[StoredResult]:
+        with self._lock:
+            result = self._results.get(result_id)
+            if result is not None and result.expires_at <= time.time():
+                self._remove(result_id)
+                result = None
+        return result
+
+    def delete(self, result_id: str):
+        with self._lock:
+            if result_id in self._results:
+                self._remove(result_id)
+
+    def _remove(self, result_id: str):
+        self._bytes -= self._size(self._results.pop(result_id))
+
+    @staticmethod
+    def _size(result: StoredResult) -> int:
+        return result.X.nbytes + result.predictions.nbytes + result.probabilities.nbytes
@@ -0,0 +1,352 @@
+# offline bulk scoring of large CSV files, with the input contract,
+# validation, model and SHAP of POST /predict but without HTTP in between.
+# The input is cut into byte ranges on line boundaries; each is parsed and
+# scored by a worker process, which writes its results to an Arrow file, and
+# this process appends those to the output in input order as they complete,
+# so row i of the output belongs to data line i of the input.
+#
+# the shard files are the checkpoint: an interrupted run leaves them in
+# --parts-dir (default: <output>.parts) and a rerun with the same input file
+# and settings scores only the missing shards. Invalid rows are reported for
+# the whole file, with rows numbered from its first data line, and no output
+# is written
+#
+# usage (from Backend/):
+#   python score.py companies.csv scores.parquet [--explain matrix] [--workers 8] [--keep company_id]
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, NamedTuple, Optional
+
+# scored rows do not repeat, so the prediction cache would only hold memory;
+# set before config is imported, spawned workers inherit it
+os.environ.setdefault("PREDICTION_CACHE_ENABLED", "0")
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+from features import final_features  # noqa: E402
+from formats import results_table  # noqa: E402
+from ingest import check_columns  # noqa: E402
+from registry import UnknownModelVersion, default_version, model_path  # noqa: E402
+from validation import MAX_FAILURES  # noqa: E402
+from workers import WorkerPool, score_frames  # noqa: E402
+
+# schemas / data contracts
+class Shard(NamedTuple):
+    index: int
+    start: int
+    end: int
+
+class ShardSettings(NamedTuple):
+    path: str
+    names: List[str]
+    keep: List[str]
+    explain: str
+    method: str
+    top_k: int
+    version: str
+    parts_dir: str
+
+class ShardResult(NamedTuple):
+    index: int
+    rows: int
+    # input validation failures, rows relative to the shard
+    failures: Optional[Dict] = None
+    error: Optional[str] = None
+
+def log(message: str):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+def part_path(parts_dir: str, index: int) -> str:
+    return os.path.join(parts_dir, f"{index:06d}.arrow")
+
+def plan_shards(path: str, shard_bytes: int) -> List[Shard]:
+    # byte ranges of about shard_bytes after the header line, each extended to
+    # the end of the line it stops in; no row is read here. Quoted values
+    # spanning lines are not supported, the inputs are numeric
+    size = os.path.getsize(path)
+    shards = []
+    with open(path, "rb") as f:
+        f.readline()
+        start = f.tell()
+        while start < size:
+            f.seek(start + shard_bytes - 1)
+            f.readline()
+            end = min(f.tell(), size)
+            shards.append(Shard(len(shards), start, end))
+            start = end
+    return shards
+
+def read_shard(settings: ShardSettings, shard: Shard) -> pd.DataFrame:
+    with open(settings.path, "rb") as f:
+        f.seek(shard.start)
+        data = f.read(shard.end - shard.start)
+    # as in ingest.read_features: model columns straight into float64, and the
+    # kept columns as text, passed through unchanged
+    dtypes = {column: str for column in settings.keep}
+    dtypes.update({feature: np.float64 for feature in final_features})
+    usecols = set(final_features) | set(settings.keep)
+    return pd.read_csv(io.BytesIO(data), header=None, names=settings.names,
+                       usecols=lambda column: column in usecols, dtype=dtypes)
+
+# run on the worker processes
+def score_shard(settings: ShardSettings, shard: Shard) -> ShardResult:
+    import pyarrow as pa
+
+    try:
+        df = read_shard(settings, shard)
+    except pd.errors.EmptyDataError:
+        # blank lines only, e.g. at the end of the file; no part file is written
+        return ShardResult(shard.index, 0)
+    except (ValueError, pd.errors.ParserError) as e:
+        return ShardResult(shard.index, 0, error=f"could not parse bytes {shard.start}-{shard.end}: {e}")
+
+    result = score_frames([df[final_features]], [settings.explain != "none"], settings.version, settings.method)[0]
+    if not result.input_report.success:
+        return ShardResult(shard.index, len(df), failures={"failed_rows": result.input_report.failed_rows,
+                                                           "failures": result.input_report.failures})
+    if not result.output_report.success:
+        return ShardResult(shard.index, len(df), error=f"output validation failed: {result.output_report.failures}")
+
+    table = results_table(result.predictions, result.probabilities, result.shap_values, settings.explain,
+                          settings.top_k)
+    for i, column in enumerate(settings.keep):
+        table = table.add_column(i, column, pa.Array.from_pandas(df[column]))
+    path = part_path(settings.parts_dir, shard.index)
+    with pa.OSFile(path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(path + ".tmp", path)
+    return ShardResult(shard.index, len(df))
+
+def run_shard(pool: WorkerPool, settings: ShardSettings, shard: Shard, stop: threading.Event) -> ShardResult:
+    try:
+        return pool.run_sync(score_shard, settings, shard)
+    except BrokenProcessPool:
+        # a worker died, e.g. killed for memory; the pool has been replaced and
+        # the shard gets one more try, unless the run is stopping anyway
+        if stop.is_set():
+            raise
+        return pool.run_sync(score_shard, settings, shard)
+
+def part_rows(path: str) -> int:
+    import pyarrow as pa
+
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().num_rows
+
+class OrderedWriter:
+    # appends shard tables to the output in shard order, holding back the ones
+    # that complete early; written to a temporary file renamed when complete
+    def __init__(self, path: str, format: str):
+        self.path = path
+        self.format = format
+        self.next = 0
+        self.rows = 0
+        self._ready = set()
+        self._writer = None
+
+    def add(self, index: int, parts_dir: str):
+        self._ready.add(index)
+        while self.next in self._ready:
+            self._write(part_path(parts_dir, self.next))
+            self._ready.remove(self.next)
+            self.next += 1
+
+    def _write(self, path: str):
+        import pyarrow as pa
+        import pyarrow.csv
+        import pyarrow.parquet as pq
+
+        if not os.path.exists(path):
+            return
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        if self._writer is None:
+            if self.format == "parquet":
+                self._writer = pq.ParquetWriter(self.path + ".tmp", table.schema)
+            else:
+                self._writer = pyarrow.csv.CSVWriter(self.path + ".tmp", table.schema)
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self, complete: bool):
+        if self._writer is not None:
+            self._writer.close()
+        if complete and self._writer is not None:
+            os.replace(self.path + ".tmp", self.path)
+        elif os.path.exists(self.path + ".tmp"):
+            os.remove(self.path + ".tmp")
+
+def load_checkpoint(parts_dir: str, manifest: Dict, restart: bool) -> bool:
+    # True when parts_dir holds shards of the same input and settings
+    path = os.path.join(parts_dir, "manifest.json")
+    if os.path.exists(path) and not restart:
+        with open(path) as f:
+            if json.load(f) == manifest:
+                return True
+        raise SystemExit(f"{parts_dir} holds shards of another input or other settings; "
+                         "pass --restart to discard them")
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+    return False
+
+def report_failures(results: Dict[int, ShardResult], counts: List[int]) -> Dict:
+    # failures of all shards, with rows numbered from the first data line
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    failed_rows, failures = 0, []
+    for index in sorted(results):
+        result = results[index]
+        if result.failures is None:
+            continue
+        failed_rows += result.failures["failed_rows"]
+        for failure in result.failures["failures"]:
+            if failure["row"] is not None:
+                failure["row"] += int(offsets[index])
+            failures.append(failure)
+    return {"message": "Input data validation failed.", "failed_rows": failed_rows,
+            "failures": failures[:MAX_FAILURES]}
+
+def format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes // 60}h{minutes % 60:02d}m" if minutes >= 60 else f"{minutes}m{seconds:02d}s"
+
+def main():
+    fork = "fork" in multiprocessing.get_all_start_methods()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="CSV file with a header line and the final_features columns")
+    parser.add_argument("output", help="results file, .csv or .parquet")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="default: from the output file name")
+    parser.add_argument("--explain", choices=["none", "matrix", "topk"], default="none",
+                        help="SHAP as one column per feature (matrix) or the top --top-k features (parquet only)")
+    parser.add_argument("--explain-method", choices=["exact", "approx"], default="exact")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--keep", action="append", default=[], metavar="COLUMN",
+                        help="input column copied to the output, e.g. an id; repeatable")
+    parser.add_argument("--model-version", help="default: the registry's default version")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pool", choices=["fork", "process"], default="fork" if fork else "process",
+                        help="fork shares the loaded model between workers")
+    parser.add_argument("--shard-mb", type=float, default=16, help="input bytes per shard")
+    parser.add_argument("--parts-dir", help="checkpoint directory, default: <output>.parts")
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint of an earlier run")
+    parser.add_argument("--keep-parts", action="store_true", help="keep the shard files after a complete run")
+    parser.add_argument("--progress-s", type=float, default=5, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    format = args.format or ("parquet" if args.output.lower().endswith((".parquet", ".pq")) else "csv")
+    if args.explain == "topk" and format != "parquet":
+        parser.error("--explain topk writes list columns and needs --format parquet")
+    parts_dir = args.parts_dir or args.output + ".parts"
+    try:
+        version = args.model_version or default_version()
+        model_path(version)
+    except UnknownModelVersion:
+        parser.error(f"unknown model version {args.model_version}")
+
+    # the header is checked up front, as POST /predict does
+    names = list(pd.read_csv(args.input, nrows=0).columns)
+    try:
+        check_columns(pd.DataFrame(columns=names))
+    except HTTPException as e:
+        sys.exit(e.detail)
+    missing = [column for column in args.keep if column not in names]
+    if missing:
+        sys.exit(f"Missing columns to keep: {missing}")
+
+    shards = plan_shards(args.input, max(1, int(args.shard_mb * 2 ** 20)))
+    if not shards:
+        sys.exit(f"{args.input} has no data rows")
+    stat = os.stat(args.input)
+    manifest = {"input": os.path.abspath(args.input), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                "explain": args.explain, "method": args.explain_method, "top_k": args.top_k, "keep": args.keep,
+                "version": version, "shards": [[shard.start, shard.end] for shard in shards]}
+    resumed = load_checkpoint(parts_dir, manifest, args.restart)
+    done = {shard.index for shard in shards if resumed and os.path.exists(part_path(parts_dir, shard.index))}
+    todo = [shard for shard in shards if shard.index not in done]
+    log(f"{args.input}: {stat.st_size / 2 ** 20:.0f} MB in {len(shards)} shards, model {version}"
+        + (f", resuming with {len(done)} shards done" if done else ""))
+
+    writer = OrderedWriter(args.output, format)
+    counts = [0] * len(shards)
+    results: Dict[int, ShardResult] = {}
+    failed = stopped = interrupted = False
+    for index in sorted(done):
+        counts[index] = part_rows(part_path(parts_dir, index))
+        writer.add(index, parts_dir)
+
+    settings = ShardSettings(os.path.abspath(args.input), names, args.keep, args.explain, args.explain_method,
+                             args.top_k, version, os.path.abspath(parts_dir))
+    start = last = time.perf_counter()
+    todo_bytes = sum(shard.end - shard.start for shard in todo)
+    bytes_done = rows_done = 0
+    pool = WorkerPool(kind=args.pool, workers=args.workers, max_pending=len(shards) + 1,
+                      version=version) if todo else None
+    # one submitting thread per worker, plus one so a worker does not wait
+    # while its last result is being received
+    threads = ThreadPoolExecutor(args.workers + 1)
+    stop = threading.Event()
+    try:
+        futures = {threads.submit(run_shard, pool, settings, shard, stop): shard for shard in todo}
+        for future in as_completed(futures):
+            shard = futures[future]
+            result = future.result()
+            results[shard.index], counts[shard.index] = result, result.rows
+            if result.error is not None:
+                # unreadable input or a broken model: later shards would fail alike
+                log(f"shard {shard.index}: {result.error}")
+                failed = stopped = True
+                break
+            if result.failures is not None:
+                failed = True
+            elif not failed:
+                writer.add(shard.index, parts_dir)
+
+            bytes_done += shard.end - shard.start
+            rows_done += result.rows
+            now = time.perf_counter()
+            if now - last >= args.progress_s or bytes_done == todo_bytes:
+                last = now
+                elapsed = now - start
+                eta = elapsed * (todo_bytes - bytes_done) / bytes_done
+                log(f"{len(done) + len(results)}/{len(shards)} shards, {rows_done:,} rows, "
+                    f"{rows_done / elapsed:,.0f} rows/s, {bytes_done / elapsed / 2 ** 20:.1f} MB/s, "
+                    f"eta {format_eta(eta)}")
+    except KeyboardInterrupt:
+        # the workers are interrupted too, their shards are scored again on resume
+        log("interrupted")
+        failed = stopped = interrupted = True
+    finally:
+        stop.set()
+        threads.shutdown(wait=False, cancel_futures=True)
+        if pool is not None:
+            pool.executor.shutdown(wait=True, cancel_futures=True)
+        writer.close(complete=not failed and writer.next == len(shards))
+
+    if interrupted:
+        sys.exit(f"no output written; scored shards are kept in {parts_dir}, rerun to resume")
+    if failed:
+        # rows are numbered across shards only when every shard was read. The
+        # shards are of no use once the input is fixed, which changes the file
+        if not stopped:
+            print(json.dumps(report_failures(results, counts), indent=2), file=sys.stderr)
+        shutil.rmtree(parts_dir)
+        sys.exit("no output written")
+    if not args.keep_parts:
+        shutil.rmtree(parts_dir)
+    log(f"{writer.rows:,} rows written to {args.output} in {time.perf_counter() - start:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+
+from config import SENSITIVITY_MAX_POINTS
+from features import final_features
+from tree_engine import FlatTreeEnsemble
+from validation import input_validator
+
+# schemas / data contracts
+class SensitivityAxis(BaseModel):
+    feature: str
+    # the values to try, or num evenly spaced values from start to stop
+    values: Optional[List[float]] = Field(None, max_length=SENSITIVITY_MAX_POINTS)
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    num: int = Field(50, ge=2, le=SENSITIVITY_MAX_POINTS)
+
+class SensitivityRequest(BaseModel):
+    # the base row: a value per feature, or a row of a summary-mode result
+    row: Optional[Dict[str, float]] = None
+    result_id: Optional[str] = None
+    result_row: Optional[int] = None
+    # one axis for a response curve, two for a surface
+    axes: List[SensitivityAxis] = Field(..., min_length=1, max_length=2)
+
+class SensitivityCurves(BaseModel):
+    model_version: str
+    base_probability: float
+    base_prediction: int
+    features: List[str]
+    values: List[List[float]]
+    # shaped like the grid: for two axes, one list per value of the first
+    probabilities: Union[List[float], List[List[float]]]
+    predictions: Union[List[int], List[List[int]]]
+
+def axis_size(axis: SensitivityAxis) -> int:
+    return len(axis.values) if axis.values is not None else axis.num
+
+def axis_values(axis: SensitivityAxis) -> np.ndarray:
+    # grid values of an axis, held to the feature's validation bounds
+    if axis.feature not in final_features:
+        raise HTTPException(status_code=400, detail=f"Unknown feature {axis.feature}.")
+    if axis.values is not None:
+        values = np.asarray(axis.values, dtype=np.float64)
+    elif axis.start is not None and axis.stop is not None:
+        values = np.linspace(axis.start, axis.stop, axis.num)
+    else:
+        raise HTTPException(status_code=400, detail=f"Axis {axis.feature} needs values, or start and stop.")
+    j = final_features.index(axis.feature)
+    lower, upper = input_validator.lower[j], input_validator.upper[j]
+    if values.size == 0 or not ((values >= lower) & (values <= upper)).all():
+        raise HTTPException(status_code=400,
+                            detail=f"Values of {axis.feature} must lie between {lower:g} and {upper:g}.")
+    return values
+
+def grid(axes: List[SensitivityAxis]) -> List[np.ndarray]:
+    if len({axis.feature for axis in axes}) < len(axes):
+        raise HTTPException(status_code=400, detail="Each feature can be varied on one axis only.")
+    # the size is checked before any grid values are built
+    points = 1
+    for axis in axes:
+        points *= axis_size(axis)
+    if points > SENSITIVITY_MAX_POINTS:
+        raise HTTPException(status_code=400,
+                            detail=f"The grid has {points} points, at most {SENSITIVITY_MAX_POINTS} are allowed.")
+    return [axis_values(axis) for axis in axes]
+
+def base_row(row: Dict[str, float]) -> np.ndarray:
+    # the base row as one float32 model row, under the /predict input rules
+    missing = [feature for feature in final_features if feature not in row]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required columns: {missing}")
+    X = np.array([[row[feature] for feature in final_features]], dtype=np.float64)
+    report = input_validator.validate_array(X)
+    if not report.success:
+        raise HTTPException(status_code=400, detail={
+            "message": "Input data validation failed.",
+            "failed_rows": report.failed_rows,
+            "failures": report.failures
+        })
+    return X[0].astype(np.float32)
+
+def scenario_matrix(base: np.ndarray, features: List[str], values: List[np.ndarray]) -> np.ndarray:
+    # the base row first, then one row per grid point in row-major order of
+    # the axes, built as one array
+    columns = [final_features.index(feature) for feature in features]
+    mesh = np.meshgrid(*values, indexing="ij")
+    X = np.empty((1 + mesh[0].size, len(base)), dtype=np.float32)
+    X[:] = base
+    for j, axis in zip(columns, mesh):
+        X[1:, j] = axis.ravel()
+    return X
+
+def distinct_rows(X: np.ndarray, features: List[str], flat: FlatTreeEnsemble) -> Tuple[np.ndarray, np.ndarray]:
+    # scenarios differ only in the varied features, and the trees compare
+    # those only to their split points: scenarios whose values fall between the
+    # same adjacent split points take the same path in every tree and get the
+    # same score. Returns one row per such group and each scenario's group
+    key = np.zeros(len(X), dtype=np.int64)
+    for feature in features:
+        j = final_features.index(feature)
+        points = flat.split_points(j)
+        key = key * (len(points) + 1) + np.searchsorted(points, X[:, j], side="right")
+    _, first, group = np.unique(key, return_index=True, return_inverse=True)
+    return first, group
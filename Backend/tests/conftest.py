@@ -0,0 +1,13 @@
+import os
+
+import pandas as pd
+import pytest
+
+from features import final_features
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "..", "Training", "inference_test.csv")
+
+@pytest.fixture(scope="session")
+def sample() -> pd.DataFrame:
+    # the model columns of the bundled test file, as floats; copy before changing
+    return pd.read_csv(SAMPLE)[final_features].astype(float)
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+import workers
+from cache import PredictionCache
+
+N_FEATURES = 3
+
+def rows(n: int, start: int = 0) -> np.ndarray:
+    return np.arange(start * N_FEATURES, (start + n) * N_FEATURES, dtype=np.float32).reshape(n, N_FEATURES)
+
+def fill(cache: PredictionCache, X: np.ndarray, explained: bool = True, model_hash: str = "m"):
+    keys = cache.keys(X, model_hash)
+    probabilities = X[:, 0] / 100
+    cache.put(keys, probabilities, X * 2, np.full(len(X), explained))
+    return keys
+
+def test_miss_then_hit():
+    cache = PredictionCache()
+    X = rows(4)
+    keys = cache.keys(X, "m")
+    found, _, _ = cache.get(keys, np.zeros(4, dtype=bool), N_FEATURES)
+    assert not found.any()
+    fill(cache, X)
+    found, probabilities, shap_values = cache.get(keys, np.ones(4, dtype=bool), N_FEATURES)
+    assert found.all()
+    np.testing.assert_array_equal(probabilities, X[:, 0] / 100)
+    np.testing.assert_array_equal(shap_values, X * 2)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (4, 4, 4)
+
+def test_keys_depend_on_values_and_model():
+    X = rows(2)
+    keys = PredictionCache.keys(X, "m")
+    assert keys == PredictionCache.keys(X.astype(np.float64), "m")
+    assert keys[0] != keys[1]
+    assert keys != PredictionCache.keys(X, "other")
+
+def test_shap_is_served_only_from_entries_that_have_it():
+    cache = PredictionCache()
+    X = rows(2)
+    keys = fill(cache, X, explained=False)
+    found, _, _ = cache.get(keys, np.array([True, False]), N_FEATURES)
+    np.testing.assert_array_equal(found, [False, True])
+
+    # a later request without SHAP keeps the SHAP stored by an earlier one
+    fill(cache, X, explained=True)
+    fill(cache, X, explained=False)
+    found, _, shap_values = cache.get(keys, np.ones(2, dtype=bool), N_FEATURES)
+    assert found.all()
+    np.testing.assert_array_equal(shap_values, X * 2)
+
+@pytest.mark.parametrize("policy, kept", [("fifo", [False, True, True]), ("lru", [True, False, True])])
+def test_eviction_at_max_entries(policy, kept):
+    cache = PredictionCache(max_entries=2, policy=policy)
+    X = rows(3)
+    keys = fill(cache, X[:2])
+    # touching the first row refreshes it under lru only
+    cache.get(keys[:1], np.zeros(1, dtype=bool), N_FEATURES)
+    fill(cache, X[2:])
+    found, _, _ = cache.get(cache.keys(X, "m"), np.zeros(3, dtype=bool), N_FEATURES)
+    np.testing.assert_array_equal(found, kept)
+    assert cache.stats()["evictions"] == 1
+
+def test_eviction_at_max_bytes():
+    cache = PredictionCache(max_entries=1000)
+    fill(cache, rows(1))
+    entry_bytes = cache.stats()["bytes"]
+    cache = PredictionCache(max_entries=1000, max_bytes=3 * entry_bytes)
+    fill(cache, rows(5))
+    stats = cache.stats()
+    assert stats["entries"] == 3
+    assert stats["bytes"] <= 3 * entry_bytes
+    assert stats["evictions"] == 2
+
+def test_expired_entries_are_dropped():
+    cache = PredictionCache(ttl=-1)
+    keys = fill(cache, rows(2))
+    found, _, _ = cache.get(keys, np.zeros(2, dtype=bool), N_FEATURES)
+    assert not found.any()
+    stats = cache.stats()
+    assert (stats["entries"], stats["expirations"], stats["bytes"]) == (0, 2, 0)
+
+@pytest.fixture(scope="module")
+def engine():
+    return workers.load_engine()
+
+def test_partial_hit_matches_uncached(engine, sample, monkeypatch):
+    X = engine.as_matrix(sample.iloc[:100])
+    explain = np.zeros(len(X), dtype=bool)
+    explain[::3] = True
+
+    monkeypatch.setattr(workers, "_cache", None)
+    expected = workers.predict_rows(engine, X, explain)
+
+    cache = PredictionCache()
+    monkeypatch.setattr(workers, "_cache", cache)
+    # rows 0-39 are cached, half of them with SHAP
+    warm = np.zeros(40, dtype=bool)
+    warm[::2] = True
+    workers.predict_rows(engine, X[:40], warm)
+    actual = workers.predict_rows(engine, X, explain)
+
+    stats = cache.stats()
+    assert 0 < stats["hits"] < len(X)
+    np.testing.assert_array_equal(actual[0], expected[0])
+    np.testing.assert_allclose(actual[1], expected[1], rtol=1e-6)
+    np.testing.assert_allclose(actual[2], expected[2], rtol=1e-5, atol=1e-6)
@@ -0,0 +1,26 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+import main
+from drift import DriftMonitor, build_reference
+
+def test_disabled_by_default():
+    assert not main.drift.enabled
+    with TestClient(main.app) as client:
+        assert client.get("/drift").status_code == 404
+        assert "bankruptcy_drift_max_psi" not in client.get("/metrics").text
+
+def test_psi_against_the_reference(sample):
+    X = sample.to_numpy(dtype=np.float64)
+    probabilities = np.linspace(0, 1, len(X))
+    monitor = DriftMonitor(build_reference(X, probabilities))
+    assert monitor.report()["max_psi"] is None
+
+    monitor.observe(X, probabilities)
+    report = monitor.report()
+    assert report["rows"] == len(X)
+    assert report["max_psi"] < 1e-9
+
+    monitor.reset()
+    monitor.observe(X, np.ones(len(X)))
+    assert monitor.report()["psi"]["probability"] > 0.25
@@ -0,0 +1,32 @@
+import pytest
+
+from formats import ARROW_STREAM, JSON, NPZ, PARQUET, negotiate, negotiate_encoding
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON),
+    ("", JSON),
+    ("*/*", JSON),
+    (ARROW_STREAM, ARROW_STREAM),
+    ("application/x-parquet", PARQUET),
+    (f"{JSON}, {ARROW_STREAM};q=0.1", JSON),
+    (f"{JSON};q=0.5, {ARROW_STREAM}", ARROW_STREAM),
+    (f"{ARROW_STREAM};q=0.2, {NPZ};q=0.9, {JSON};q=0.5", NPZ),
+    (f"{ARROW_STREAM}, {PARQUET}", ARROW_STREAM),
+    (f"{ARROW_STREAM};q=0", JSON),
+    ("text/html, */*;q=0.8", JSON),
+    ("text/csv", JSON),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept) == expected
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, None),
+    ("gzip, deflate", "gzip"),
+    ("gzip, zstd", "zstd"),
+    ("zstd;q=0.5, gzip", "gzip"),
+    ("*", "zstd"),
+    ("zstd;q=0, *;q=0.1", "gzip"),
+    ("identity", None),
+])
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
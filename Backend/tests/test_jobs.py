@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import main
+from features import final_features
+from jobs import JobRunner, JobStore
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "..", "Training", "inference_test.csv")
+CHUNK_ROWS = 150
+
+class StallingPool:
+    # scores the first `limit` chunks, then blocks for good, as if the
+    # process had been killed in the middle of the next chunk
+    def __init__(self, pool, limit: int):
+        self.pool = pool
+        self.limit = limit
+        self.calls = 0
+        self.stalled = threading.Event()
+
+    def score_sync(self, *args):
+        self.calls += 1
+        if self.calls > self.limit:
+            self.stalled.set()
+            threading.Event().wait()
+        return self.pool.score_sync(*args)
+
+def wait_for(store: JobStore, job_id: str, status: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.load(job_id)
+        if job.status == status:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not reach {status}: {job}")
+
+def test_resume_after_interruption(tmp_path):
+    rows = len(pd.read_csv(SAMPLE))
+    chunks = -(-rows // CHUNK_ROWS)
+    store = JobStore(str(tmp_path))
+
+    interrupted = StallingPool(main.pool, limit=3)
+    with open(SAMPLE, "rb") as f:
+        job = JobRunner(interrupted, store, workers=1).submit(
+            f, "text/csv", "inference_test.csv", "full", "exact", main.registry.active, CHUNK_ROWS)
+    assert interrupted.stalled.wait(60)
+    job = store.load(job.id)
+    assert (job.status, job.chunks_done, job.rows_done) == ("running", 3, 3 * CHUNK_ROWS)
+
+    # a new runner on the same directory picks the job up and scores only
+    # the chunks without a result file
+    resumed = StallingPool(main.pool, limit=chunks)
+    JobRunner(resumed, store, workers=1)
+    job = wait_for(store, job.id, "completed")
+    assert resumed.calls == chunks - 3
+    assert (job.total_rows, job.rows_done, job.chunks_done) == (rows, rows, chunks)
+    assert sorted(os.listdir(store.path(job.id, "results"))) == [f"{i:06d}.arrow" for i in range(chunks)]
+
+    predictions, probabilities, shap_values = store.read_rows(job, 0, rows)
+    with TestClient(main.app) as client, open(SAMPLE, "rb") as f:
+        response = client.post("/predict", params={"explain": "full"},
+                               files={"file": ("inference_test.csv", f, "text/csv")})
+    assert response.status_code == 200
+    expected = response.json()
+    np.testing.assert_array_equal(predictions, expected["predictions"])
+    np.testing.assert_allclose(probabilities, expected["probabilities"], rtol=1e-6)
+    np.testing.assert_allclose(
+        shap_values, [[row[feature] for feature in final_features] for row in expected["shap_values"]],
+        rtol=1e-5, atol=1e-6)
+
+    # reads that straddle chunk boundaries line up with the full read
+    middle = store.read_rows(job, CHUNK_ROWS - 10, CHUNK_ROWS + 20)
+    np.testing.assert_array_equal(middle[1], probabilities[CHUNK_ROWS - 10:2 * CHUNK_ROWS + 10])
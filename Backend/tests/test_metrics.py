@@ -0,0 +1,18 @@
+import metrics
+
+def test_samples_belong_to_their_declared_metric():
+    metrics.REQUEST_BYTES.labels("/predict").inc(10)
+    metrics.STAGE_SECONDS.labels("predict").observe(0.01)
+    types, samples = {}, []
+    for line in metrics.render().splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            types[name] = kind
+        elif not line.startswith("#"):
+            samples.append(line.split("{")[0].split()[0])
+
+    suffixes = {"counter": ("",), "gauge": ("",), "histogram": ("_bucket", "_sum", "_count")}
+    for sample in samples:
+        assert any(sample == name + suffix for name, kind in types.items() for suffix in suffixes[kind]), sample
+    assert types["bankruptcy_request_bytes_total"] == "counter"
+    assert 'bankruptcy_request_bytes_total{route="/predict"}' in metrics.render()
@@ -0,0 +1,14 @@
+from fastapi.testclient import TestClient
+
+import artifact
+import main
+
+def test_importance_does_not_rehash_the_model(monkeypatch):
+    with TestClient(main.app) as client:
+        hashed = []
+        monkeypatch.setattr(artifact, "model_hash", lambda path: hashed.append(path))
+        for _ in range(3):
+            response = client.get("/importance")
+            assert response.status_code == 200
+            assert response.json()["model_version"] == main.registry.active
+    assert hashed == []
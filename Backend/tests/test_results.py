@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from results import ResultStore, select_rows, summarize
+
+PROBABILITIES = np.array([0.05, 0.95, 0.3, 0.5, 0.81, 0.2, 0.79])
+PREDICTIONS = (PROBABILITIES >= 0.5).astype(np.int64)
+
+def test_summarize():
+    summary = summarize(PREDICTIONS, PROBABILITIES, top_n=3)
+    assert (summary["rows"], summary["bankrupt"], summary["healthy"]) == (7, 4, 3)
+    # lower bounds are inclusive: 0.2 is low risk, 0.8 is very high
+    assert [band["count"] for band in summary["risk_bands"]] == [1, 2, 1, 1, 2]
+    assert [top["row"] for top in summary["top"]] == [1, 4, 6]
+    assert summary["confidence"]["min"] == pytest.approx(0.5)
+    assert summary["confidence"]["max"] == pytest.approx(0.95)
+    assert summary["confidence"]["mean_probability"] == pytest.approx(PROBABILITIES.mean())
+
+def test_summarize_empty():
+    summary = summarize(np.zeros(0, dtype=np.int64), np.zeros(0), top_n=10)
+    assert (summary["rows"], summary["bankrupt"], summary["healthy"], summary["top"]) == (0, 0, 0, [])
+    assert all(band["count"] == 0 for band in summary["risk_bands"])
+    assert summary["confidence"] == {"mean": 0.0, "min": 0.0, "max": 0.0, "mean_probability": 0.0}
+
+@pytest.mark.parametrize("band, order, low, high, expected", [
+    (None, "row", None, None, [0, 1, 2, 3, 4, 5, 6]),
+    (None, "risk", None, None, [1, 4, 6, 3, 2, 5, 0]),
+    (None, "probability", 0.2, 0.5, [5, 2, 3]),
+    ("Very High Risk", "row", None, None, [1, 4]),
+    ("High Risk", "risk", None, None, [6]),
+    ("Low Risk", "probability", None, 0.25, [5]),
+    ("Moderate Risk", "row", 0.6, None, []),
+])
+def test_select_rows(band, order, low, high, expected):
+    np.testing.assert_array_equal(select_rows(PROBABILITIES, band, order, low, high), expected)
+
+def put(store: ResultStore, n: int):
+    X = np.ones((n, 4), dtype=np.float32)
+    return store.put("v1", X, np.zeros(n, dtype=np.int64), np.zeros(n))[0]
+
+def test_views_are_stored_as_counted_copies():
+    store = ResultStore(max_bytes=1 << 20, ttl=60)
+    batch = np.zeros(10000)
+    _, stored = store.put("v1", np.ones((2, 4)), batch[:2].astype(np.int64), batch[:2])
+    assert stored.probabilities.base is None
+    assert store._bytes == 2 * 4 * 4 + 2 * 8 + 2 * 8
+
+def test_oldest_results_are_evicted_beyond_max_bytes():
+    row_bytes = 4 * 4 + 8 + 8
+    store = ResultStore(max_bytes=25 * row_bytes, ttl=60)
+    first, second, third = put(store, 10), put(store, 10), put(store, 10)
+    assert store.get(first) is None
+    assert store.get(second) is not None and store.get(third) is not None
+    assert store._bytes == 20 * row_bytes
+
+    # a result larger than the limit is kept on its own
+    big = put(store, 100)
+    assert store.get(big) is not None and store.get(third) is None
+    store.delete(big)
+    assert store._bytes == 0
+
+def test_expired_results_are_dropped():
+    store = ResultStore(max_bytes=1 << 20, ttl=-1)
+    result_id = put(store, 3)
+    assert store.get(result_id) is None
+    assert store._bytes == 0
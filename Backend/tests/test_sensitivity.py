@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+import sensitivity
+import workers
+from config import SENSITIVITY_MAX_POINTS
+from features import final_features
+from registry import default_version
+from sensitivity import SensitivityAxis, distinct_rows, grid, scenario_matrix
+
+FEATURES = final_features[:2]
+
+@pytest.fixture(scope="module")
+def engine():
+    return workers.get_engine(default_version())
+
+def crossing_values(points: np.ndarray) -> np.ndarray:
+    # every sixth split point and the value just below it, so the grid lands
+    # on both sides of many split points, plus an even sweep whose values
+    # often share an interval
+    points = points[::6]
+    below = np.nextafter(points, np.float32(-np.inf))
+    sweep = np.linspace(points[0], points[-1], 60)
+    return np.unique(np.concatenate([points, below, sweep]).astype(np.float32))
+
+def test_grouped_scores_match_scoring_every_scenario(engine, sample):
+    base = sample.to_numpy(dtype=np.float32)[0]
+    values = [crossing_values(engine.flat.split_points(final_features.index(f))) for f in FEATURES]
+    X = scenario_matrix(base, FEATURES, values)
+
+    first, group = distinct_rows(X, FEATURES, engine.flat)
+    assert 1 < len(first) < len(X)
+    _, expected, _ = engine.predict(X, explain=False)
+    # scenarios of a group take the same path through every tree
+    np.testing.assert_array_equal(expected[first][group], expected)
+
+    result = workers.score_scenarios(base, FEATURES, values, default_version())
+    assert result.output_report.success
+    np.testing.assert_allclose(result.probabilities, expected, rtol=1e-6, atol=1e-7)
+    np.testing.assert_array_equal(result.predictions, (expected >= 0.5).astype(result.predictions.dtype))
+
+def test_oversized_grid_is_rejected_before_building_values(monkeypatch):
+    def build(axis):
+        raise AssertionError("grid values were built")
+
+    monkeypatch.setattr(sensitivity, "axis_values", build)
+    axes = [SensitivityAxis(feature=f, start=0, stop=1, num=SENSITIVITY_MAX_POINTS) for f in FEATURES]
+    with pytest.raises(HTTPException) as error:
+        grid(axes)
+    assert error.value.status_code == 400
+
+def test_oversized_grid_returns_400(sample):
+    row = sample.iloc[0].to_dict()
+    axes = [{"feature": f, "start": 0, "stop": 1, "num": SENSITIVITY_MAX_POINTS} for f in FEATURES]
+    with TestClient(main.app) as client:
+        response = client.post("/sensitivity", json={"row": row, "axes": axes})
+    assert response.status_code == 400
+    assert f"at most {SENSITIVITY_MAX_POINTS}" in response.json()["detail"]
@@ -0,0 +1,25 @@
+import json
+import os
+
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import main
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "..", "Training", "inference_test.csv")
+
+def test_stream_reads_past_the_first_chunk():
+    rows = len(pd.read_csv(SAMPLE))
+    chunk_rows = 300
+    with TestClient(main.app) as client, open(SAMPLE, "rb") as f:
+        response = client.post(
+            "/predict/stream",
+            params={"chunk_rows": chunk_rows, "explain": "none"},
+            files={"file": ("inference_test.csv", f, "text/csv")},
+        )
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) > 1
+    assert all("error" not in line for line in lines)
+    assert [line["offset"] for line in lines] == list(range(0, rows, chunk_rows))
+    assert sum(len(line["predictions"]) for line in lines) == rows
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from features import final_features
+from tree_engine import FlatTreeEnsemble
+
+MODEL = os.path.join(os.path.dirname(__file__), "..", "model.json")
+TOLERANCE = 1e-5
+
+@pytest.fixture(scope="module")
+def booster() -> xgb.Booster:
+    return xgb.Booster(model_file=MODEL)
+
+@pytest.fixture(scope="module")
+def flat() -> FlatTreeEnsemble:
+    return FlatTreeEnsemble.from_json(MODEL)
+
+def xgb_margins(booster: xgb.Booster, X: np.ndarray) -> np.ndarray:
+    return booster.predict(xgb.DMatrix(X, feature_names=final_features), output_margin=True)
+
+def sigmoid(margins: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-margins))
+
+def with_missing(X: np.ndarray) -> np.ndarray:
+    X = X.copy()
+    X[::3, ::4] = np.nan
+    X[1::7, 1::3] = np.nan
+    return X
+
+@pytest.mark.parametrize("missing", [False, True])
+def test_margins_match_xgboost(booster, flat, sample, missing):
+    X = sample.to_numpy(dtype=np.float32)
+    if missing:
+        X = with_missing(X)
+    expected = xgb_margins(booster, X)
+    actual = flat.margins(X)
+    # xgboost sums the leaves in float32
+    np.testing.assert_allclose(actual, expected, rtol=TOLERANCE, atol=TOLERANCE)
+    np.testing.assert_allclose(sigmoid(actual), sigmoid(expected), atol=TOLERANCE)
+
+def test_npz_round_trip(flat, sample, tmp_path):
+    path = tmp_path / "flat.npz"
+    flat.to_npz(path)
+    loaded = FlatTreeEnsemble.from_npz(path)
+    X = with_missing(sample.to_numpy(dtype=np.float32))
+    np.testing.assert_array_equal(loaded.margins(X), flat.margins(X))
+
+def test_split_points_bound_the_branches(flat, sample):
+    # a value anywhere between two adjacent split points of a feature gets the
+    # same scores; crossing split points changes them
+    X = sample.to_numpy(dtype=np.float32)[:20]
+    j = 0
+    points = flat.split_points(j)
+    assert np.all(np.diff(points) > 0)
+    scores = []
+    for lower, upper in zip(points[:-1], points[1:]):
+        first, last = X.copy(), X.copy()
+        first[:, j] = lower
+        last[:, j] = np.nextafter(upper, np.float32(-np.inf))
+        np.testing.assert_array_equal(flat.margins(first), flat.margins(last))
+        scores.append(flat.margins(first))
+    assert len(np.unique(np.array(scores), axis=0)) > 1
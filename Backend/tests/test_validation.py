@@ -0,0 +1,72 @@
+import numpy as np
+
+from features import features_0_1, features_0_1e10, final_features
+from validation import audit_input, input_validator
+
+UNIT = next(feature for feature in final_features if feature in features_0_1)
+WIDE = next(feature for feature in final_features if feature in features_0_1e10)
+
+def test_valid_frame_passes(sample):
+    report = input_validator.validate(sample)
+    assert report.success
+    assert report.failed_rows == 0
+    assert report.failures == []
+
+def test_missing_column(sample):
+    report = input_validator.validate(sample.drop(columns=[WIDE]))
+    assert not report.success
+    assert report.failed_rows == len(sample)
+    assert report.failures == [
+        {"expectation": "expect_column_to_exist", "column": WIDE, "row": None, "value": None}]
+
+def test_null_and_out_of_range_values(sample):
+    df = sample.copy()
+    df.loc[3, UNIT] = np.nan
+    df.loc[5, UNIT] = 1.5
+    df.loc[7, WIDE] = 2e10
+    df.loc[7, UNIT] = -0.1
+    report = input_validator.validate(df)
+    assert not report.success
+    # row 7 fails twice but counts once
+    assert report.failed_rows == 3
+    assert sorted((f["expectation"], f["column"], f["row"], f["value"]) for f in report.failures) == [
+        ("expect_column_values_to_be_between", UNIT, 5, 1.5),
+        ("expect_column_values_to_be_between", UNIT, 7, -0.1),
+        ("expect_column_values_to_be_between", WIDE, 7, 2e10),
+        ("expect_column_values_to_not_be_null", UNIT, 3, None),
+    ]
+
+def test_bounds_are_inclusive(sample):
+    df = sample.copy()
+    df.loc[0, UNIT] = 1.0
+    df.loc[1, WIDE] = 1e10
+    df.loc[2, WIDE] = 0.0
+    assert input_validator.validate(df).success
+
+def test_failures_are_truncated_but_rows_are_counted(sample):
+    X = sample.to_numpy(dtype=np.float64, copy=True)
+    X[:40, final_features.index(UNIT)] = np.nan
+    X[:40, final_features.index(WIDE)] = -1
+    report = input_validator.validate_array(X, max_failures=5)
+    assert not report.success
+    assert len(report.failures) == 5
+    assert report.failed_rows == 40
+
+def test_agrees_with_great_expectations_audit(sample):
+    df = sample.head(50).copy()
+    df.loc[3, UNIT] = np.nan
+    df.loc[5, UNIT] = 1.5
+    df.loc[7, WIDE] = 2e10
+    report = input_validator.validate(df)
+    audit = audit_input(df)
+    assert report.success == audit["success"]
+
+    failed = {(r["expectation_config"]["expectation_type"], r["expectation_config"]["kwargs"]["column"])
+              for r in audit["results"] if not r["success"]}
+    assert failed == {(f["expectation"], f["column"]) for f in report.failures}
+    for r in audit["results"]:
+        if not r["success"] and r["expectation_config"]["expectation_type"] == "expect_column_values_to_be_between":
+            column = r["expectation_config"]["kwargs"]["column"]
+            rows = sorted(f["row"] for f in report.failures
+                          if f["column"] == column and f["expectation"] == "expect_column_values_to_be_between")
+            assert rows == sorted(r["result"]["partial_unexpected_index_list"])
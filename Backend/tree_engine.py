@@ -0,0 +1,118 @@
+import json
+
+import numpy as np
+
+class FlatTreeEnsemble:
+    # the trees of an XGBoost binary:logistic model.json flattened into
+    # contiguous arrays, scored with vectorized level-by-level traversal;
+    # meant for small batches where DMatrix setup dominates
+    def __init__(self, split_index: np.ndarray, threshold: np.ndarray, children: np.ndarray,
+                 default_right: np.ndarray, value: np.ndarray, roots: np.ndarray, depth: int,
+                 base_margin: float):
+        self.split_index = split_index
+        self.threshold = threshold
+        # children[2 * node] is the left child, children[2 * node + 1] the right one;
+        # leaves point to themselves so every row can take the same number of steps
+        self.children = children
+        self.default_right = default_right
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+        self.base_margin = base_margin
+        self._split_points = {}
+
+    @classmethod
+    def from_json(cls, path: str) -> "FlatTreeEnsemble":
+        with open(path) as f:
+            learner = json.load(f)["learner"]
+
+        if learner["objective"]["name"] != "binary:logistic":
+            raise ValueError(f"Unsupported objective {learner['objective']['name']}.")
+        booster = learner["gradient_booster"]
+        if booster["name"] != "gbtree":
+            raise ValueError(f"Unsupported booster {booster['name']}.")
+
+        split_index, threshold, children, default_right, value, roots = [], [], [], [], [], []
+        depth, offset = 0, 0
+        for tree in booster["model"]["trees"]:
+            if any(tree["split_type"]):
+                raise ValueError("Categorical splits are not supported.")
+            left = np.asarray(tree["left_children"], dtype=np.int64)
+            right = np.asarray(tree["right_children"], dtype=np.int64)
+            n = len(left)
+            node = np.arange(n)
+            leaf = left == -1
+
+            # leaf values are stored in split_conditions
+            conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+            split_index.append(np.where(leaf, 0, tree["split_indices"]))
+            threshold.append(conditions)
+            value.append(np.where(leaf, conditions, 0).astype(np.float32))
+            children.append(np.stack([np.where(leaf, node, left), np.where(leaf, node, right)], axis=1).ravel() + offset)
+            default_right.append(np.asarray(tree["default_left"]) == 0)
+            roots.append(offset)
+
+            node_depth = np.zeros(n, dtype=np.int64)
+            for i in range(n):
+                if not leaf[i]:
+                    node_depth[left[i]] = node_depth[right[i]] = node_depth[i] + 1
+            depth = max(depth, int(node_depth.max()))
+            offset += n
+
+        base_score = learner["learner_model_param"]["base_score"].strip("[]")
+        base_score = float(base_score)
+        return cls(
+            np.concatenate(split_index).astype(np.intp),
+            np.concatenate(threshold),
+            np.concatenate(children).astype(np.intp),
+            np.concatenate(default_right),
+            np.concatenate(value),
+            np.asarray(roots, dtype=np.intp),
+            depth,
+            float(np.log(base_score / (1 - base_score))),
+        )
+
+    # the arrays saved as-is, so loading skips parsing the model JSON
+    def to_npz(self, path: str):
+        np.savez(path, split_index=self.split_index, threshold=self.threshold, children=self.children,
+                 default_right=self.default_right, value=self.value, roots=self.roots,
+                 depth=self.depth, base_margin=self.base_margin)
+
+    @classmethod
+    def from_npz(cls, path: str) -> "FlatTreeEnsemble":
+        with np.load(path) as arrays:
+            return cls(
+                arrays["split_index"].astype(np.intp, copy=False),
+                arrays["threshold"],
+                arrays["children"].astype(np.intp, copy=False),
+                arrays["default_right"],
+                arrays["value"],
+                arrays["roots"].astype(np.intp, copy=False),
+                int(arrays["depth"]),
+                float(arrays["base_margin"]),
+            )
+
+    def split_points(self, feature: int) -> np.ndarray:
+        # sorted thresholds of all splits on a feature: values between two
+        # adjacent ones take the same branch at every such split
+        points = self._split_points.get(feature)
+        if points is None:
+            internal = self.children[0::2] != np.arange(len(self.split_index))
+            points = np.unique(self.threshold[internal & (self.split_index == feature)])
+            self._split_points[feature] = points
+        return points
+
+    def margins(self, X: np.ndarray) -> np.ndarray:
+        # same comparison as xgboost: float32 value < float32 threshold goes left,
+        # missing values follow the default direction
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.depth):
+            x = X[rows, self.split_index[nodes]]
+            go_right = ~(x < self.threshold[nodes])
+            missing = np.isnan(x)
+            if missing.any():
+                go_right = np.where(missing, self.default_right[nodes], go_right)
+            nodes = self.children[2 * nodes + go_right]
+        return self.base_margin + self.value[nodes].sum(axis=1, dtype=np.float64)
@@ -0,0 +1,160 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from features import final_features, features_0_1, features_0_1e10
+
+logger = logging.getLogger("uvicorn.error")
+
+# cap on failure details returned to the client
+MAX_FAILURES = 100
+
+# schemas / data contracts
+@dataclass
+class ValidationReport:
+    success: bool
+    failed_rows: int = 0
+    failures: List[Dict] = field(default_factory=list)
+
+def _failure(expectation: str, column: str, row: Optional[int] = None, value=None) -> Dict:
+    return {"expectation": expectation, "column": column, "row": row, "value": value}
+
+class InputValidator:
+    # column / null / type / range rules compiled once into bound arrays
+    def __init__(self, columns: Sequence[str], lower: np.ndarray, upper: np.ndarray):
+        self.columns = list(columns)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+
+    @classmethod
+    def compile(cls, columns: Sequence[str] = final_features) -> "InputValidator":
+        lower = np.full(len(columns), -np.inf)
+        upper = np.full(len(columns), np.inf)
+        for j, feature in enumerate(columns):
+            if feature in features_0_1:
+                lower[j], upper[j] = 0, 1
+            elif feature in features_0_1e10:
+                lower[j], upper[j] = 0, 1e10
+            else:
+                logger.warning(f"Feature {feature} not assigned to a validation group.")
+        return cls(columns, lower, upper)
+
+    def validate(self, df: pd.DataFrame, max_failures: int = MAX_FAILURES) -> ValidationReport:
+        # column-level rules: existence and float dtype
+        failures = [
+            _failure("expect_column_to_exist", column)
+            for column in self.columns if column not in df.columns
+        ]
+        failures += [
+            _failure("expect_column_values_to_be_of_type", column)
+            for column in self.columns
+            if column in df.columns and df[column].dtype.kind != "f"
+        ]
+        if failures:
+            return ValidationReport(success=False, failed_rows=len(df), failures=failures[:max_failures])
+
+        return self.validate_array(df[self.columns].to_numpy(dtype=np.float64, copy=False), max_failures)
+
+    def validate_array(self, X: np.ndarray, max_failures: int = MAX_FAILURES) -> ValidationReport:
+        # value-level rules: one pass each for nulls and bounds over the whole batch
+        null_mask = np.isnan(X)
+        range_mask = (X < self.lower) | (X > self.upper)
+        bad_rows = np.flatnonzero((null_mask | range_mask).any(axis=1))
+        if bad_rows.size == 0:
+            return ValidationReport(success=True)
+
+        rows, cols = np.nonzero(null_mask[bad_rows] | range_mask[bad_rows])
+        failures = []
+        for i, j in zip(bad_rows[rows[:max_failures]], cols[:max_failures]):
+            if null_mask[i, j]:
+                failures.append(_failure("expect_column_values_to_not_be_null", self.columns[j], int(i)))
+            else:
+                failures.append(_failure("expect_column_values_to_be_between", self.columns[j], int(i), float(X[i, j])))
+        return ValidationReport(success=False, failed_rows=int(bad_rows.size), failures=failures)
+
+class OutputValidator:
+    def validate(self, predictions, probabilities, max_failures: int = MAX_FAILURES) -> ValidationReport:
+        predictions = np.asarray(predictions)
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+
+        bad_pred = (predictions != 0) & (predictions != 1)
+        bad_prob = ~((probabilities >= 0) & (probabilities <= 1))
+        bad_rows = np.flatnonzero(bad_pred | bad_prob)
+        if bad_rows.size == 0:
+            return ValidationReport(success=True)
+
+        failures = []
+        for i in bad_rows[:max_failures]:
+            if bad_pred[i]:
+                failures.append(_failure("expect_column_values_to_be_in_set", "predictions", int(i), float(predictions[i])))
+            if bad_prob[i]:
+                failures.append(_failure("expect_column_values_to_be_between", "probabilities", int(i), float(probabilities[i])))
+        return ValidationReport(success=False, failed_rows=int(bad_rows.size), failures=failures[:max_failures])
+
+# compiled once at startup
+input_validator = InputValidator.compile()
+output_validator = OutputValidator()
+
+def validate_input(df: pd.DataFrame) -> ValidationReport:
+    return input_validator.validate(df)
+
+def validate_output(predictions: List[int], probabilities: List[float]) -> ValidationReport:
+    return output_validator.validate(predictions, probabilities)
+
+# great expectations audit mode (offline, not on the request path)
+def audit_input(df: pd.DataFrame) -> dict:
+    import great_expectations as ge
+
+    batch = ge.from_pandas(df)
+    batch.expectation_suite_name = "input_suite"
+
+    for feature in final_features:
+        batch.expect_column_to_exist(column=feature)
+        batch.expect_column_values_to_not_be_null(column=feature)
+        batch.expect_column_values_to_be_of_type(column=feature, type_="float")
+
+        if feature in features_0_1:
+            batch.expect_column_values_to_be_between(column=feature, min_value=0, max_value=1)
+        elif feature in features_0_1e10:
+            batch.expect_column_values_to_be_between(column=feature, min_value=0, max_value=1e10)
+        else:
+            logger.warning(f"Feature {feature} not assigned to a validation group.")
+
+    return batch.validate(result_format="SUMMARY")
+
+def audit_output(predictions: List[int], probabilities: List[float]) -> dict:
+    import great_expectations as ge
+
+    df = pd.DataFrame({
+        'predictions': predictions,
+        'probabilities': probabilities
+    })
+
+    batch = ge.from_pandas(df)
+    batch.expectation_suite_name = "output_suite"
+    batch.expect_column_to_exist(column="predictions")
+    batch.expect_column_values_to_be_in_set(column="predictions", value_set=[0, 1])
+    batch.expect_column_to_exist(column="probabilities")
+    batch.expect_column_values_to_be_between(column="probabilities", min_value=0, max_value=1)
+
+    return batch.validate(result_format="SUMMARY")
+
+# usage: python validation.py data.csv
+if __name__ == "__main__":
+    import sys
+
+    df = pd.read_csv(sys.argv[1])
+    df = df[[c for c in final_features if c in df.columns]].astype(float)
+
+    report = validate_input(df)
+    results = audit_input(df)
+    print(f"compiled validator: success={report.success} failed_rows={report.failed_rows}")
+    for failure in report.failures:
+        print(f"  {failure}")
+    print(f"great expectations audit: success={results['success']}")
+    if report.success != results["success"]:
+        print("MISMATCH between compiled validator and great expectations audit")
+        sys.exit(1)
@@ -0,0 +1,398 @@
+import asyncio
+import gc
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+import artifact
+from cache import PredictionCache, create_cache
+from config import WORKER_POOL, WORKER_COUNT, MAX_PENDING_REQUESTS, FLAT_ENGINE_MAX_ROWS, MODEL_PATH
+from features import final_features
+from inference import InferenceEngine
+from metrics import observe_stages, stage
+from registry import default_version, model_path
+from sensitivity import distinct_rows, scenario_matrix
+from tree_engine import FlatTreeEnsemble
+from validation import ValidationReport, validate_input, validate_output
+
+logger = logging.getLogger("uvicorn.error")
+
+# schemas / data contracts
+class ScoreResult(NamedTuple):
+    input_report: ValidationReport
+    output_report: Optional[ValidationReport] = None
+    predictions: Optional[np.ndarray] = None
+    probabilities: Optional[np.ndarray] = None
+    shap_values: Optional[np.ndarray] = None
+    # seconds per stage of the model call this frame was scored in
+    timings: Optional[Dict[str, float]] = None
+
+class PoolSaturated(Exception):
+    pass
+
+# engines by model version and the prediction cache used by jobs in this
+# process; spawned process workers load their own copies, forked ones start
+# with the engines preloaded here. _engine serves jobs that do not name a version
+_engine: Optional[InferenceEngine] = None
+_engines: Dict[str, InferenceEngine] = {}
+_engines_lock = threading.Lock()
+_nthread: Optional[int] = None
+_cache: Optional[PredictionCache] = create_cache()
+
+# a batch above FLAT_ENGINE_MAX_ROWS rows, so warm-up covers both scoring paths
+WARMUP_ROWS = 64
+
+def load_engine(model_path: str = MODEL_PATH, nthread: Optional[int] = None,
+                version: Optional[str] = None) -> InferenceEngine:
+    # precomputed artifact when it matches the model, the model JSON otherwise
+    model_hash = artifact.model_hash(model_path)
+    loaded = artifact.load(model_path, flat=FLAT_ENGINE_MAX_ROWS > 0, model_sha256=model_hash)
+    if loaded is not None:
+        booster, flat = loaded
+    else:
+        booster = xgb.Booster()
+        booster.load_model(model_path)
+        flat = FlatTreeEnsemble.from_json(model_path) if FLAT_ENGINE_MAX_ROWS > 0 else None
+    if nthread:
+        booster.set_param("nthread", nthread)
+    return InferenceEngine(booster, flat=flat, version=version or model_hash[:12], model_hash=model_hash)
+
+def warm_up(engine: InferenceEngine) -> InferenceEngine:
+    # first calls pay for lazy allocations in xgboost; all-zero rows are valid input
+    for rows in (1, WARMUP_ROWS):
+        engine.predict(np.zeros((rows, len(final_features)), dtype=np.float32))
+    return engine
+
+def get_engine(version: Optional[str] = None) -> InferenceEngine:
+    # the engine of a version, loaded and warmed on first use
+    if version is None:
+        return _engine
+    engine = _engines.get(version)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(version)
+            if engine is None:
+                engine = warm_up(load_engine(model_path(version), _nthread, version))
+                _engines[version] = engine
+    return engine
+
+def load_version(version: str):
+    # warms a version in this process without returning the engine to the caller
+    get_engine(version)
+
+def init_worker(version: str, nthread: Optional[int] = None):
+    global _nthread
+    _nthread = nthread
+    set_engine(get_engine(version))
+
+def preload(version: str):
+    # loads a version in this process for workers forked from it to share: the
+    # booster and the flat engine's arrays are only read while scoring, so their
+    # pages stay shared copy-on-write. It is not warmed up and xgboost runs on
+    # one thread here, so no OpenMP thread pool exists for the fork to break
+    with _engines_lock:
+        if version not in _engines:
+            _engines[version] = load_engine(model_path(version), 1, version)
+
+def init_forked_worker(version: str, nthread: int):
+    # preloaded engines get the worker's share of the cores; warm-up
+    # allocations are private to each worker
+    global _nthread
+    _nthread = nthread
+    for engine in list(_engines.values()):
+        engine.booster.set_param("nthread", nthread)
+    set_engine(warm_up(get_engine(version)))
+
+def memory_usage(pid: int) -> Optional[Dict[str, int]]:
+    # bytes resident (rss), proportional (pss: shared pages split between the
+    # processes mapping them), private to the process (uss) and shared, from
+    # /proc on linux; None elsewhere or when the process is gone
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) * 1024 for line in f if line.endswith("kB\n")}
+    except OSError:
+        return None
+    uss = fields["Private_Clean"] + fields["Private_Dirty"]
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "uss": uss, "shared": fields["Rss"] - uss}
+
+def set_engine(engine: InferenceEngine):
+    global _engine
+    _engines.setdefault(engine.version, engine)
+    _engine = engine
+
+def cache_stats() -> Optional[dict]:
+    return _cache.stats() if _cache is not None else None
+
+def predict_rows(engine: InferenceEngine, X: np.ndarray, explain: np.ndarray,
+                 timings: Optional[Dict[str, float]] = None, method: str = "exact"):
+    # predictions and probabilities for every row, SHAP for the rows flagged in
+    # explain; rows found in the cache skip the model
+    if _cache is None:
+        predictions, probabilities, shap_values = engine.predict(X, explain=bool(explain.all()), timings=timings,
+                                                                 method=method)
+        if not explain.all() and explain.any():
+            with stage(timings, "explain"):
+                shap_values = engine.explain(X[explain], method)
+        return predictions, probabilities, shap_values
+
+    # the cache holds exact SHAP only; approximate SHAP costs about as much as
+    # a prediction and is computed after the cache lookup
+    approx = method != "exact"
+    cached_explain = np.zeros_like(explain) if approx else explain
+    with stage(timings, "cache"):
+        keys = _cache.keys(X, engine.model_hash)
+        found, probabilities, shap_values = _cache.get(keys, cached_explain, X.shape[1])
+    miss = np.flatnonzero(~found)
+    if miss.size:
+        miss_explain = cached_explain[miss]
+        _, probabilities[miss], miss_shap = engine.predict(X[miss], explain=bool(miss_explain.all()),
+                                                           timings=timings)
+        if miss_explain.all():
+            shap_values[miss] = miss_shap
+        elif miss_explain.any():
+            with stage(timings, "explain"):
+                shap_values[miss[miss_explain]] = engine.explain(X[miss[miss_explain]])
+        with stage(timings, "cache"):
+            _cache.put([keys[i] for i in miss], probabilities[miss], shap_values[miss], miss_explain)
+    predictions = (probabilities > engine.threshold).astype(np.int64)
+    if approx and explain.any():
+        with stage(timings, "explain"):
+            return predictions, probabilities, engine.explain(X[explain], method)
+    return predictions, probabilities, shap_values[explain] if explain.any() else None
+
+# jobs, run on the pool
+def score_frames(frames: List[pd.DataFrame], explain: List[bool], version: Optional[str] = None,
+                 method: str = "exact") -> List[ScoreResult]:
+    # validates each frame, scores the valid ones in one model call and
+    # validates each frame's output
+    engine = get_engine(version)
+    results: List[Optional[ScoreResult]] = [None] * len(frames)
+    timings: Dict[str, float] = {}
+    valid = []
+    for i, df in enumerate(frames):
+        with stage(timings, "validate_input"):
+            report = validate_input(df)
+        if report.success:
+            valid.append(i)
+        else:
+            results[i] = ScoreResult(report, timings=timings)
+    if not valid:
+        return results
+
+    matrices = [engine.as_matrix(frames[i]) for i in valid]
+    X = matrices[0] if len(matrices) == 1 else np.concatenate(matrices)
+
+    # SHAP only for the rows of frames that asked for it
+    sizes = np.array([len(m) for m in matrices])
+    flags = np.array([explain[i] for i in valid])
+    predictions, probabilities, shap_values = predict_rows(engine, X, np.repeat(flags, sizes), timings, method)
+
+    start, shap_start = 0, 0
+    for i, size, flag in zip(valid, sizes, flags):
+        end = start + size
+        frame_shap = None
+        if flag and shap_values is not None:
+            frame_shap = shap_values[shap_start:shap_start + size]
+            shap_start += size
+        frame_predictions, frame_probabilities = predictions[start:end], probabilities[start:end]
+        with stage(timings, "validate_output"):
+            output_report = validate_output(frame_predictions, frame_probabilities)
+        results[i] = ScoreResult(
+            ValidationReport(success=True),
+            output_report,
+            frame_predictions,
+            frame_probabilities,
+            frame_shap,
+            timings,
+        )
+        start = end
+    return results
+
+def explain_rows(X: np.ndarray, version: Optional[str] = None, method: str = "exact") -> np.ndarray:
+    # SHAP of already validated rows, e.g. one row of a stored result
+    engine = get_engine(version)
+    explain = np.ones(len(X), dtype=bool)
+    return predict_rows(engine, X, explain, method=method)[2]
+
+def score_scenarios(base: np.ndarray, features: List[str], values: List[np.ndarray],
+                    version: Optional[str] = None) -> ScoreResult:
+    # what-if grid around a validated base row, generated here so only the
+    # axes are sent to a process worker; one model call, without SHAP or the
+    # prediction cache, whose entries these rows would only evict
+    engine = get_engine(version)
+    timings: Dict[str, float] = {}
+    X = scenario_matrix(base, features, values)
+    if engine.flat is None:
+        predictions, probabilities, _ = engine.predict(X, explain=False, timings=timings)
+    else:
+        # the split points of the flattened trees tell which scenarios score
+        # alike; a dense sweep has far fewer distinct rows than points
+        first, group = distinct_rows(X, features, engine.flat)
+        predictions, probabilities, _ = engine.predict(X[first], explain=False, timings=timings)
+        predictions, probabilities = predictions[group], probabilities[group]
+    with stage(timings, "validate_output"):
+        output_report = validate_output(predictions, probabilities)
+    return ScoreResult(ValidationReport(success=True), output_report, predictions, probabilities, timings=timings)
+
+class WorkerPool:
+    # runs the CPU-bound stages on a thread or process pool and bounds the
+    # number of requests admitted at once
+    def __init__(self, kind: str = WORKER_POOL, workers: int = WORKER_COUNT,
+                 max_pending: int = MAX_PENDING_REQUESTS, version: Optional[str] = None,
+                 engine: Optional[InferenceEngine] = None):
+        version = version or default_version()
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.version = version
+        self._lock = threading.Lock()
+        self._restart_lock = threading.Lock()
+
+        if kind in ("process", "fork"):
+            # cores are split between workers to avoid oversubscription
+            self.nthread = max(1, (os.cpu_count() or 1) // workers)
+            self.executor: Executor = self._start_processes(version)
+        else:
+            set_engine(engine if engine is not None else get_engine(version))
+            self.executor = ThreadPoolExecutor(workers, thread_name_prefix="inference")
+
+    def _start_processes(self, version: str) -> ProcessPoolExecutor:
+        if self.kind == "process":
+            # spawned workers each import the modules and load the model
+            return ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(version, self.nthread),
+            )
+        # forked workers start from this process with the model loaded once.
+        # Objects are frozen out of the garbage collector around the fork, so
+        # collections in the workers do not write to, and unshare, their pages
+        preload(version)
+        executor = ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=init_forked_worker,
+            initargs=(version, self.nthread),
+        )
+        gc.collect()
+        gc.freeze()
+        try:
+            # with fork, the first submit starts all workers
+            executor.submit(os.getpid)
+        finally:
+            gc.unfreeze()
+        return executor
+
+    def _restart(self, broken: Executor):
+        # a worker that died, e.g. killed for memory, breaks its pool; the first
+        # call to notice replaces the pool. Calls that were pending or running
+        # on the broken pool fail and are not retried
+        with self._restart_lock:
+            if self.executor is broken:
+                logger.error("A worker process died, restarting the worker pool.")
+                self.executor = self._start_processes(self.version)
+
+    def acquire(self):
+        # backpressure: reject instead of queueing without bound
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise PoolSaturated()
+            self.pending += 1
+
+    def release(self):
+        with self._lock:
+            self.pending -= 1
+
+    @asynccontextmanager
+    async def admit(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def score(self, frames: List[pd.DataFrame], explain: List[bool],
+                    version: Optional[str] = None, method: str = "exact") -> List[ScoreResult]:
+        results = await self.run(score_frames, frames, explain, version, method)
+        observe_stages(results[0].timings)
+        return results
+
+    def score_sync(self, frames: List[pd.DataFrame], explain: List[bool],
+                   version: Optional[str] = None, method: str = "exact") -> List[ScoreResult]:
+        results = self.run_sync(score_frames, frames, explain, version, method)
+        observe_stages(results[0].timings)
+        return results
+
+    def warm(self, version: str):
+        # loads and warms a version off the request path. Forked workers are
+        # replaced by new ones started after the version is preloaded here;
+        # calls in flight finish on the old ones. Spawned workers each keep
+        # their own engines; one warm-up job is sent per worker, and a worker
+        # that does not pick one up loads the version on first use
+        if self.kind == "fork":
+            with self._restart_lock:
+                old, self.executor = self.executor, self._start_processes(version)
+                self.version = version
+            old.shutdown(wait=False)
+        elif self.kind == "process":
+            for future in [self.executor.submit(load_version, version) for _ in range(self.workers)]:
+                future.result()
+        else:
+            load_version(version)
+
+    def _submit(self, fn, *args) -> Tuple[Executor, Future]:
+        executor = self.executor
+        try:
+            return executor, executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # broken before this call: the call goes to the replacement pool
+            self._restart(executor)
+            executor = self.executor
+            return executor, executor.submit(fn, *args)
+
+    async def run(self, fn, *args):
+        executor, future = self._submit(fn, *args)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+
+    def run_sync(self, fn, *args):
+        # for callers already running on a worker thread, e.g. streaming generators
+        executor, future = self._submit(fn, *args)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+
+    async def cache_stats(self) -> Optional[dict]:
+        # process workers keep their own caches; this reports the one that ran the call
+        if self.kind != "thread":
+            return await self.run(cache_stats)
+        return cache_stats()
+
+    def memory(self) -> List[Dict]:
+        # memory of this process and of each worker process; the pss of all of
+        # them adds up to the memory they use together
+        processes = [("server", os.getpid())]
+        if self.kind != "thread":
+            # ProcessPoolExecutor keeps its live worker processes by pid
+            pids = sorted(getattr(self.executor, "_processes", None) or {})
+            processes += [(f"worker-{i}", pid) for i, pid in enumerate(pids)]
+        return [{"process": name, "pid": pid, **(memory_usage(pid) or {})} for name, pid in processes]
+
+    def stats(self) -> dict:
+        return {"kind": self.kind, "workers": self.workers, "pending": self.pending, "max_pending": self.max_pending}
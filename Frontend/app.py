@@ -1,12 +1,23 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import requests
+import hashlib
 import io
 import os
 import plotly.graph_objects as go
 import plotly.express as px
 
 api_url = os.environ.get("GCP_API_URL", "http://localhost:8080/predict")
+# result handles of summary-mode predictions live under the same server
+results_url = api_url.rsplit("/predict", 1)[0] + "/results"
+# rows per page of the results table
+page_rows = int(os.environ.get("RESULT_PAGE_ROWS", "50"))
+# rows of the upload parsed for the preview; the backend parses the whole file
+preview_rows = 5
+# results are kept for this many uploaded files per server, for at most this many seconds
+results_cache_files = int(os.environ.get("RESULTS_CACHE_FILES", "8"))
+results_cache_ttl = int(os.environ.get("RESULTS_CACHE_TTL_S", "3600"))
 
 # initialization
 st.set_page_config(
@@ -49,19 +60,11 @@ required_columns = [
     'Average Collection Days'
 ]
 
-# helper functions
+all_categories = ['Very Low Risk', 'Low Risk', 'Moderate Risk', 'High Risk', 'Very High Risk']
 
-def categorize_confidence(probability):
-    if probability < 0.2:
-        return "Very Low Risk"
-    elif probability < 0.4:
-        return "Low Risk"
-    elif probability < 0.6:
-        return "Moderate Risk"
-    elif probability < 0.8:
-        return "High Risk"
-    else:
-        return "Very High Risk"
+sort_orders = {'row': 'Row', 'risk': 'Highest risk first', 'probability': 'Lowest risk first'}
+
+# helper functions
 
 def display_sample_format():
     st.markdown("### Sample Format")
@@ -69,27 +72,87 @@ def display_sample_format():
     sample_df.loc[0] = [0.1] * len(required_columns)
     st.dataframe(sample_df.head(1))
 
-def predict_bankruptcy(file_content):
+class PredictionError(Exception):
+    pass
+
+class ResultExpired(Exception):
+    pass
+
+@st.cache_resource
+def get_session():
+    # one keep-alive connection pool shared by all sessions of this server
+    return requests.Session()
+
+# memoized per uploaded file hash, so widget interactions re-run the script
+# without re-parsing the file or calling the backend; failures are not cached
+@st.cache_data(max_entries=results_cache_files, ttl=results_cache_ttl, show_spinner=False)
+def read_uploaded_csv(file_hash, _file_content):
+    return pd.read_csv(io.BytesIO(_file_content), nrows=preview_rows)
+
+# the backend returns counts per risk band, statistics and a result id;
+# rows and explanations are fetched from the result when they are shown
+@st.cache_data(max_entries=results_cache_files, ttl=results_cache_ttl, show_spinner=False)
+def fetch_predictions(file_hash, _file_content):
+    files = {'file': ('data.csv', _file_content, 'text/csv')}
+    response = get_session().post(api_url, params={'output': 'summary'}, files=files)
+    if response.status_code != 200:
+        raise PredictionError(f"Error: API returned status code {response.status_code}. Details: {response.text}")
+    return response.json()
+
+def fetch_result(path, params=None):
+    response = get_session().get(f"{results_url}/{path}", params=params)
+    if response.status_code == 404:
+        # dropped by the server, the file is scored again
+        raise ResultExpired()
+    if response.status_code != 200:
+        raise PredictionError(f"Error: API returned status code {response.status_code}. Details: {response.text}")
+    return response.json()
+
+# one page of rows, filtered and sorted by the backend
+@st.cache_data(max_entries=64, ttl=results_cache_ttl, show_spinner=False)
+def fetch_rows(result_id, risk_filter, order, probability_range, offset):
+    params = {
+        'offset': offset,
+        'limit': page_rows,
+        'order': order,
+        'min_probability': probability_range[0],
+        'max_probability': probability_range[1],
+    }
+    if risk_filter != 'All':
+        params['band'] = risk_filter
+    return fetch_result(f"{result_id}/rows", params)
+
+@st.cache_data(max_entries=256, ttl=results_cache_ttl, show_spinner=False)
+def fetch_explanation(result_id, row):
+    return fetch_result(f"{result_id}/rows/{row}/explanation")
+
+def prediction_confidence(probability):
+    return np.maximum(probability, 1 - probability) * 100
+
+def risk_categories(probabilities, summary):
+    # band of each probability, on the backend's band edges
+    bands = summary['risk_bands']
+    names = np.array([band['band'] for band in bands])
+    return names[np.digitize(probabilities, [band['lower'] for band in bands[1:]])]
+
+def predict_bankruptcy(file_hash, file_content):
     try:
-        files = {'file': ('data.csv', file_content, 'text/csv')}
-        response = requests.post(api_url, files=files)
-            
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Error: API returned status code {response.status_code}. Details: {response.text}")
+        return fetch_predictions(file_hash, file_content)
+    except PredictionError as e:
+        st.error(str(e))
     except requests.exceptions.RequestException as e:
         st.error(f"Connection error: {e}")
     except Exception as e:
         st.error(f"An unexpected error occurred: {e}")
 
-def display_sample_explanation(idx):
+def display_sample_explanation(summary, idx):
     st.subheader(f"Row {idx}")
     
-    pred = df['Bankruptcy Prediction'][idx]
-    prob = df['Prediction Confidence'][idx]
-    shap = df['Shap Value'][idx]
-    risk = df['Risk Category'][idx]
+    explanation = fetch_explanation(summary['result_id'], idx)
+    pred = explanation['prediction']
+    prob = prediction_confidence(explanation['probability'])
+    shap = explanation['shap_values']
+    risk = risk_categories([explanation['probability']], summary)[0]
     
     col1, col2 = st.columns(2)
     with col1:
@@ -151,20 +214,12 @@ def display_sample_explanation(idx):
     
     st.plotly_chart(fig, use_container_width=True)
 
-def display_confidence_distribution(df):
-    df['Risk Category'] = df['Bankruptcy Confidence'].apply(lambda p: categorize_confidence(p))
-    
-    category_counts = df['Risk Category'].value_counts().reset_index()
-    category_counts.columns = ['Risk Category', 'Count']
-    
-    all_categories = ['Very Low Risk', 'Low Risk', 'Moderate Risk', 'High Risk', 'Very High Risk']
-    for category in all_categories:
-        if category not in category_counts['Risk Category'].values:
-            category_counts = pd.concat([category_counts, pd.DataFrame({'Risk Category': [category], 'Count': [0]})])
-    
-    category_order = {cat: i for i, cat in enumerate(all_categories)}
-    category_counts['Order'] = category_counts['Risk Category'].map(category_order)
-    category_counts = category_counts.sort_values('Order')
+def display_confidence_distribution(summary):
+    # counts per band come from the backend, every band included
+    category_counts = pd.DataFrame({
+        'Risk Category': [band['band'] for band in summary['risk_bands']],
+        'Count': [band['count'] for band in summary['risk_bands']],
+    })
     
     higher_risk_categories = ['Moderate Risk', 'High Risk', 'Very High Risk']
     higher_risk_df = category_counts[category_counts['Risk Category'].isin(higher_risk_categories)]
@@ -233,20 +288,14 @@ def display_confidence_distribution(df):
     
     return {"full": fig1, "log_scale": fig2, "high_risk_focus": fig3}
 
-def display_predictions(df, predictions):
-    df['Bankruptcy Prediction'] = predictions['predictions']
-    df['Bankruptcy Confidence'] = predictions['probabilities']
-    df['Risk Category'] = [categorize_confidence(p) for p in df['Bankruptcy Confidence']]
-    df['Prediction Confidence'] = df['Bankruptcy Confidence'].apply(lambda p: max(p, 1-p) * 100)
-    df['Shap Value'] = predictions['shap_values']
-    
+def display_predictions(summary):
     # Prediction Results
     st.subheader("Prediction Results")
     
-    total_predictions = len(predictions['predictions'])
-    bankruptcy_count = sum(predictions['predictions'])
-    healthy_count = total_predictions - bankruptcy_count
-    avg_confidence = df['Prediction Confidence'].mean()
+    total_predictions = summary['rows']
+    bankruptcy_count = summary['bankrupt']
+    healthy_count = summary['healthy']
+    avg_confidence = summary['confidence']['mean'] * 100
     
     col1, col2 = st.columns(2)
     
@@ -258,7 +307,7 @@ def display_predictions(df, predictions):
         st.metric("Companies Predicted Healthy", healthy_count)
         st.metric("Companies Predicted Bankrupt", bankruptcy_count)
     
-    risk_figs = display_confidence_distribution(df)
+    risk_figs = display_confidence_distribution(summary)
     
     # separate tabs
     viz_tab1, viz_tab2, viz_tab3 = st.tabs(["Standard Distribution", "Log Scale View", "High Risk Focus"])
@@ -275,30 +324,60 @@ def display_predictions(df, predictions):
     # Individual Company Explanations
     st.subheader("Individual Company Explanations")
 
-    risk_filter = st.selectbox(
-        "Filter by risk category:",
-        options=['All'] + ['Very Low Risk', 'Low Risk', 'Moderate Risk', 'High Risk', 'Very High Risk'],
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        risk_filter = st.selectbox("Filter by risk category:", options=['All'] + all_categories)
+    with col2:
+        order = st.selectbox("Sort by:", options=list(sort_orders), format_func=sort_orders.get)
+    with col3:
+        probability_range = st.slider("Bankruptcy probability:", 0.0, 1.0, (0.0, 1.0), step=0.01)
+
+    # the page number is read before the page is fetched and its input drawn
+    # below the table; new filters start a new input at page 1
+    view = (summary['result_id'], risk_filter, order, probability_range)
+    page_key = "page-" + "-".join(map(str, view))
+    page = st.session_state.get(page_key, 1)
+    rows = fetch_rows(*view, (page - 1) * page_rows)
+
+    if not rows['rows']:
+        st.warning("No companies match the selected filters.")
+        return
+
+    probabilities = np.asarray(rows['probabilities'])
+    page_df = pd.DataFrame({
+        'Row': rows['rows'],
+        'Prediction': np.where(np.asarray(rows['predictions']) == 1, 'Bankrupt', 'Healthy'),
+        'Bankruptcy Probability': probabilities,
+        'Confidence (%)': prediction_confidence(probabilities),
+        'Risk Category': risk_categories(probabilities, summary),
+    })
+    event = st.dataframe(
+        page_df,
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=f"table-{page_key}-{page}",
     )
-    
-    if risk_filter == 'All':
-        filtered_indices = list(range(len(df)))
-    else:
-        filtered_indices = [i for i, cat in enumerate(df['Risk Category']) if cat == risk_filter]
-    
-    if filtered_indices:
-        format_func = lambda i: f"Row {i} - {'Bankrupt' if predictions['predictions'][i] == 1 else 'Healthy'} ({df['Prediction Confidence'][i]:.2f}%) - {df['Risk Category'][i]}"
-        
-        sorted_indices = sorted(filtered_indices)
-        
-        selected_row = st.selectbox(
-            "Select a company to view detailed explanation:",
-            options=sorted_indices,
-            format_func=format_func
-        )
-        
-        display_sample_explanation(selected_row)
+
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        pages = -(-rows['total'] // page_rows)
+        st.number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+    with col2:
+        st.caption(f"Companies {rows['offset'] + 1}-{rows['offset'] + len(rows['rows'])} "
+                   f"of {rows['total']}, page {page} of {pages}.")
+
+    lookup = st.number_input("Look up a company by row:", min_value=0, max_value=summary['rows'] - 1,
+                             value=None, step=1)
+
+    # one explanation at a time, fetched when a company is picked
+    if lookup is not None:
+        display_sample_explanation(summary, int(lookup))
+    elif event.selection.rows:
+        display_sample_explanation(summary, int(page_df['Row'].iloc[event.selection.rows[0]]))
     else:
-        st.warning(f"No companies found in the '{risk_filter}' category.")
+        st.info("Select a company in the table, or look one up by row, to view its explanation.")
 
 # Sidebar
 with st.sidebar:
@@ -336,19 +415,27 @@ with st.expander("View expected CSV format"):
 
 if uploaded_file is not None:
     try:
-        file_content = uploaded_file.read()
-        df = pd.read_csv(io.BytesIO(file_content))
+        file_content = uploaded_file.getvalue()
+        file_hash = hashlib.sha256(file_content).hexdigest()
+        df = read_uploaded_csv(file_hash, file_content)
         
         with st.spinner("Processing data and making predictions..."):
-            predictions = predict_bankruptcy(file_content.decode('utf-8'))
+            summary = predict_bankruptcy(file_hash, file_content)
             
-            if predictions:
+            if summary:
                 df = df[required_columns]
 
                 st.subheader("Data Preview")
                 st.dataframe(df.head())
                 
-                display_predictions(df, predictions)
+                display_predictions(summary)
+    except ResultExpired:
+        # scored again once per file, in case the server keeps dropping results
+        if st.session_state.get('rescored') != file_hash:
+            st.session_state['rescored'] = file_hash
+            fetch_predictions.clear()
+            st.rerun()
+        st.error("The prediction results expired on the server. Please upload the file again.")
     except pd.errors.ParserError:
         st.error("Invalid CSV file. Please upload a properly formatted CSV file.")
     except Exception as e:
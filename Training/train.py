@@ -0,0 +1,220 @@
+# scriptable version of the training steps in EDA.ipynb:
+#   1. drop features correlated above --corr-threshold with an earlier column
+#   2. train / test / out-of-sample split (80 / 10 / 10, stratified)
+#   3. rank features by mean |SHAP| of a default model, keep the top --features
+#   4. random search over the notebook's grid, scored by ROC AUC over
+#      stratified CV folds trained in parallel; n_estimators is replaced by
+#      early stopping on each fold, and the refit uses the mean best round
+#   5. refit on the training split and score train / test / OOS
+# trees use the hist method. Steps 1-4 are cached in --cache-dir, keyed on the
+# data file's hash and the settings they depend on, so a rerun with other
+# search or output settings skips the steps that did not change.
+#
+# writes to --out (default: a new version directory for the backend's model
+# registry, picked up by POST /models/reload):
+#   model.json     - the model
+#   reference.json - drift reference histograms of the training split
+#   importance.json - global mean |SHAP| per feature on the training split
+#   metrics.json   - selected features, parameters, CV and hold-out scores
+#   artifact/      - the backend's precomputed model artifact
+#
+# usage (from Training/, with the Backend environment):
+#   python train.py --data bankruptcy_data.csv [--n-iter 100] [--out ../Backend/models/2025-06-01]
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import average_precision_score, brier_score_loss, confusion_matrix, f1_score, roc_auc_score
+from sklearn.model_selection import ParameterSampler, StratifiedKFold, train_test_split
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import artifact  # noqa: E402
+from drift import build_reference, reference_path_for  # noqa: E402
+from features import final_features  # noqa: E402
+from importance import build_importance, importance_path_for  # noqa: E402
+
+TARGET = "Bankrupt?"
+
+PARAM_DIST = {
+    "max_depth": [3, 5, 7, 10],
+    "learning_rate": [0.01, 0.05, 0.1, 0.2],
+    "subsample": [0.6, 0.8, 1.0],
+    "colsample_bytree": [0.6, 0.8, 1.0],
+    "gamma": [0, 0.1, 0.3, 0.5],
+    "reg_alpha": [0, 0.1, 0.5, 1.0],
+    "reg_lambda": [1.0, 1.5, 2.0],
+}
+
+def log(message: str):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:16]
+
+def cached(cache_dir: str, step: str, key: str, compute):
+    # JSON result of a step, computed once per key
+    path = os.path.join(cache_dir, f"{step}-{key}.json")
+    if os.path.exists(path):
+        log(f"{step}: cached")
+        with open(path) as f:
+            return json.load(f)
+    start = time.perf_counter()
+    result = compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(result, f)
+    os.replace(path + ".tmp", path)
+    log(f"{step}: {time.perf_counter() - start:.1f} s")
+    return result
+
+def correlated_features(df: pd.DataFrame, threshold: float) -> list:
+    # the notebook's rule on the full correlation matrix, target included: a
+    # column goes when it correlates above the threshold with any earlier one
+    corr = np.abs(np.corrcoef(df.to_numpy(dtype=np.float64), rowvar=False))
+    drop = np.tril(corr > threshold, k=-1).any(axis=1)
+    return [column for column, d in zip(df.columns, drop) if d and column != TARGET]
+
+def split_indices(y: pd.Series, seed: int) -> dict:
+    index = np.arange(len(y))
+    train, temp = train_test_split(index, test_size=0.2, random_state=seed, stratify=y)
+    test, oos = train_test_split(temp, test_size=0.5, random_state=seed, stratify=y.iloc[temp])
+    return {"train": train.tolist(), "test": test.tolist(), "oos": oos.tolist()}
+
+def base_params(y: pd.Series, nthread: int, seed: int) -> dict:
+    # scale_pos_weight over the whole data set, as in the notebook
+    return {"objective": "binary:logistic", "tree_method": "hist", "scale_pos_weight": (y == 0).sum() / (y == 1).sum(),
+            "nthread": nthread, "seed": seed}
+
+def rank_features(X: pd.DataFrame, y: pd.Series, seed: int) -> list:
+    # mean |SHAP| of the notebook's default model (100 trees), from the
+    # booster's own contributions instead of a shap explainer
+    dtrain = xgb.DMatrix(X, label=y)
+    booster = xgb.train({**base_params(y, os.cpu_count(), seed), "eval_metric": "logloss"}, dtrain, 100)
+    importance = np.abs(booster.predict(dtrain, pred_contribs=True)[:, :-1]).mean(axis=0)
+    return [X.columns[i] for i in np.argsort(-importance, kind="stable")]
+
+def search(X: pd.DataFrame, y: pd.Series, args) -> dict:
+    folds = list(StratifiedKFold(n_splits=args.folds, shuffle=True, random_state=args.seed).split(X, y))
+    # fold matrices are built once and shared by all candidates; the folds of
+    # a candidate train concurrently, xgboost releases the GIL while training
+    nthread = max(1, (os.cpu_count() or 1) // args.folds)
+    matrices = []
+    for train, valid in folds:
+        dtrain = xgb.QuantileDMatrix(X.iloc[train], label=y.iloc[train])
+        matrices.append((dtrain, xgb.DMatrix(X.iloc[valid], label=y.iloc[valid])))
+    params = {**base_params(y, nthread, args.seed), "eval_metric": "auc"}
+
+    def fit_fold(candidate, dtrain, dvalid):
+        booster = xgb.train({**params, **candidate}, dtrain, args.max_rounds, evals=[(dvalid, "valid")],
+                            early_stopping_rounds=args.early_stopping, verbose_eval=False)
+        return booster.best_score, booster.best_iteration + 1
+
+    results = []
+    candidates = list(ParameterSampler(PARAM_DIST, args.n_iter, random_state=args.seed))
+    with ThreadPoolExecutor(args.folds) as executor:
+        for i, candidate in enumerate(candidates):
+            scores, rounds = zip(*executor.map(lambda m: fit_fold(candidate, *m), matrices))
+            results.append({"params": candidate, "auc": float(np.mean(scores)), "rounds": int(np.mean(rounds))})
+            if (i + 1) % 10 == 0 or i + 1 == len(candidates):
+                log(f"search: {i + 1}/{len(candidates)} candidates, best ROC AUC "
+                    f"{max(r['auc'] for r in results):.4f}")
+    return max(results, key=lambda r: r["auc"])
+
+def scores(model, X: pd.DataFrame, y: pd.Series) -> dict:
+    probabilities = model.predict_proba(X)[:, 1]
+    predictions = (probabilities > 0.5).astype(int)
+    return {
+        "f1": f1_score(y, predictions),
+        "roc_auc": roc_auc_score(y, probabilities),
+        "average_precision": average_precision_score(y, probabilities),
+        "brier": brier_score_loss(y, probabilities),
+        "confusion_matrix": confusion_matrix(y, predictions).tolist(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="bankruptcy_data.csv")
+    parser.add_argument("--out", default=os.path.join(BACKEND_DIR, "models", time.strftime("%Y-%m-%d-%H%M%S")))
+    parser.add_argument("--cache-dir", default=".cache")
+    parser.add_argument("--corr-threshold", type=float, default=0.7)
+    parser.add_argument("--features", type=int, default=30)
+    parser.add_argument("--n-iter", type=int, default=100, help="random search candidates")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--max-rounds", type=int, default=1000, help="upper bound on trees, the notebook's largest n_estimators")
+    parser.add_argument("--early-stopping", type=int, default=50, help="rounds without a better fold AUC")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = pd.read_csv(args.data)
+    df.columns = df.columns.str.strip()
+    data_key = file_hash(args.data)
+
+    corr_key = cache_key(data_key, args.corr_threshold)
+    dropped = cached(args.cache_dir, "correlated", corr_key, lambda: correlated_features(df, args.corr_threshold))
+    X = df.drop(columns=dropped + [TARGET])
+    y = df[TARGET]
+
+    split_key = cache_key(data_key, args.seed)
+    splits = cached(args.cache_dir, "splits", split_key, lambda: split_indices(y, args.seed))
+    X_train, y_train = X.iloc[splits["train"]], y.iloc[splits["train"]]
+
+    rank_key = cache_key(corr_key, split_key)
+    ranking = cached(args.cache_dir, "ranking", rank_key, lambda: rank_features(X_train, y_train, args.seed))
+    features = ranking[:args.features]
+    # the backend passes features in the order of Backend/features.py, which
+    # the model's columns have to follow
+    if sorted(features) == sorted(final_features):
+        features = final_features
+    else:
+        log("the selected features differ from Backend/features.py, update final_features to serve this model")
+    X_train = X_train[features]
+
+    search_key = cache_key(rank_key, args.features, args.n_iter, args.folds, args.max_rounds, args.early_stopping)
+    best = cached(args.cache_dir, "search", search_key, lambda: search(X_train, y_train, args))
+    log(f"best CV ROC AUC {best['auc']:.4f} at {best['rounds']} trees: {json.dumps(best['params'])}")
+
+    model = xgb.XGBClassifier(objective="binary:logistic", eval_metric="logloss", tree_method="hist",
+                              random_state=args.seed, n_estimators=best["rounds"],
+                              scale_pos_weight=(y == 0).sum() / (y == 1).sum(), **best["params"])
+    model.fit(X_train, y_train)
+    metrics = {split: scores(model, X.iloc[splits[split]][features], y.iloc[splits[split]])
+               for split in ("train", "test", "oos")}
+    for split, values in metrics.items():
+        log(f"{split}: " + ", ".join(f"{k} {v:.4f}" for k, v in values.items() if k != "confusion_matrix"))
+
+    os.makedirs(args.out, exist_ok=True)
+    model_path = os.path.join(args.out, "model.json")
+    model.save_model(model_path)
+
+    # backend artifacts, built with the backend's own code
+    with open(reference_path_for(model_path), "w") as f:
+        json.dump(build_reference(X_train.to_numpy(dtype=np.float64), model.predict_proba(X_train)[:, 1],
+                                  features=features), f)
+    with open(importance_path_for(model_path), "w") as f:
+        json.dump({**build_importance(model.get_booster(), X_train.to_numpy(dtype=np.float32), features),
+                   "source": "training split"}, f, indent=2)
+    artifact.build(model_path)
+    with open(os.path.join(args.out, "metrics.json"), "w") as f:
+        json.dump({"data_sha256": data_key, "features": features, "dropped": dropped, "params": best["params"],
+                   "n_estimators": best["rounds"], "cv_roc_auc": best["auc"], "scores": metrics}, f, indent=2)
+    log(f"model written to {args.out} in {time.perf_counter() - start:.0f} s")
+
+if __name__ == "__main__":
+    main()